@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Time of the export of a users table of a SQLite stand-in database with
+export_users, and with export_partitioned in 1, 2, 4... partitions,
+checking that every export writes the same rows in the same order.
+
+Usage: ./benchmark_export.py [number_of_rows] [max_partitions]
+"""
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from functools import partial
+
+from filtered_logger import USER_COLUMNS, export_partitioned, export_users
+
+
+def create_users(path: str, count: int) -> None:
+    """Create a users table of count random rows, indexed on last_login."""
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE users ({})".format(", ".join(USER_COLUMNS)))
+    start = datetime.datetime(2019, 1, 1)
+    db.executemany(
+        "INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (("user{}".format(i), "user{}@example.com".format(i),
+          "(555) 010-{:04d}".format(i % 10000),
+          "000-12-{:04d}".format(i % 10000),
+          "$2b$12$" + "x" * 53, "10.0.{}.{}".format(i // 256 % 256, i % 256),
+          str(start + datetime.timedelta(
+              seconds=random.randrange(365 * 86400))),
+          "Mozilla/5.0 (Windows NT 10.0; Win64; x64)")
+         for i in range(count)))
+    db.execute("CREATE INDEX users_last_login ON users (last_login)")
+    db.commit()
+    db.close()
+
+
+def rows(path: str) -> list:
+    """Return the lines of an export, without their log header."""
+    with open(path) as export:
+        return [line.split(": ", 1)[1] for line in export]
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    max_partitions = int(sys.argv[2]) if len(sys.argv) > 2 \
+        else os.cpu_count() or 1
+    directory = tempfile.mkdtemp()
+    database = os.path.join(directory, "users.db")
+    create_users(database, count)
+    connect = partial(sqlite3.connect, database)
+    print("rows: {}, cpus: {}".format(count, os.cpu_count()))
+
+    output = os.path.join(directory, "serial.log")
+    start = time.perf_counter()
+    db = connect()
+    with open(output, "w") as stream:
+        export_users(db, stream, column="last_login")
+    db.close()
+    elapsed = time.perf_counter() - start
+    print("export_users: {:.2f}s ({:.0f} rows/s)".format(
+        elapsed, count / elapsed))
+    expected = rows(output)
+
+    partitions = 1
+    while partitions <= max_partitions:
+        output = os.path.join(directory, "partitioned.log")
+        start = time.perf_counter()
+        export_partitioned(output, connect, partitions)
+        elapsed = time.perf_counter() - start
+        assert rows(output) == expected
+        print("export_partitioned, {} partitions: {:.2f}s ({:.0f} rows/s)"
+              .format(partitions, elapsed, count / elapsed))
+        partitions *= 2
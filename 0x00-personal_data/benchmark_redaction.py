@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Throughput (records/s) of the redaction of log messages holding PII
+and of clean ones: filter_datum compiling its pattern on every call (as
+it did before Redactor), filter_datum and RedactingFormatter.format.
+
+Usage: ./benchmark_redaction.py [number_of_records]
+"""
+import logging
+import re
+import sys
+import timeit
+from typing import List
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, filter_datum
+
+MESSAGES = {
+    "pii": "name=Bob;email=bob@dylan.com;phone=(555) 010-1234;"
+           "ssn=000-123-0000;password=bobby2019;ip=60ed:c396:2ff:244:bbd0;"
+           "last_login=2019-11-14T06:16:24;user_agent=Mozilla/5.0;",
+    "clean": "ip=60ed:c396:2ff:244:bbd0;last_login=2019-11-14T06:16:24;"
+             "user_agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64);",
+}
+
+
+def compiling_filter_datum(
+    fields: List[str], redaction: str, message: str, separator: str
+) -> str:
+    """filter_datum as it was: the pattern is compiled on every call."""
+    pattern = re.compile(r"((?:{0})=)[^{1}]*{1}".format(
+        "|".join(fields), separator))
+    return pattern.sub(r"\1{}{}".format(redaction, separator), message)
+
+
+def rate(function, count: int) -> float:
+    """Return the number of calls of function per second."""
+    return count / timeit.timeit(function, number=count)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    fields = list(PII_FIELDS)
+    formatter = RedactingFormatter(fields)
+    for kind, message in MESSAGES.items():
+        record = logging.LogRecord("user_data", logging.INFO, None, None,
+                                   message, None, None)
+        print("{} messages:".format(kind))
+        print("  compiling filter_datum: {:10.0f} records/s".format(rate(
+            lambda: compiling_filter_datum(fields, "***", message, ";"),
+            count)))
+        print("  filter_datum:           {:10.0f} records/s".format(rate(
+            lambda: filter_datum(fields, "***", message, ";"), count)))
+        print("  RedactingFormatter:     {:10.0f} records/s".format(rate(
+            lambda: formatter.format(record), count)))
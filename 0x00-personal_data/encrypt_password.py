@@ -1,8 +1,59 @@
 #!/usr/bin/env python3
 """Password Encryption and Validation
 """
+import os
+import time
+from functools import lru_cache
+
 import bcrypt
 
+# bcrypt's default, used before calibration: calibrating only raises it
+MIN_ROUNDS = 12
+MAX_ROUNDS = 16
+DEFAULT_TARGET_MS = 250
+
+
+def calibrate_rounds(target_ms: float = DEFAULT_TARGET_MS) -> int:
+    """
+    Finds the highest bcrypt work factor whose verification takes at
+    most target_ms on this machine, from the timing of a cheap hash
+    (each extra round doubles the cost), and never less than MIN_ROUNDS.
+
+    Args:
+        target_ms (float): The target verification latency.
+
+    Returns:
+        int: The work factor, within [MIN_ROUNDS, MAX_ROUNDS].
+    """
+    probe_rounds = 6
+    hashed = bcrypt.hashpw(b"calibration", bcrypt.gensalt(probe_rounds))
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        bcrypt.checkpw(b"calibration", hashed)
+        timings.append(time.perf_counter() - start)
+    budget = target_ms / (min(timings) * 1000)
+    rounds = probe_rounds
+    while rounds < MAX_ROUNDS and 2 ** (rounds + 1 - probe_rounds) <= budget:
+        rounds += 1
+    return max(rounds, MIN_ROUNDS)
+
+
+@lru_cache(maxsize=None)
+def default_rounds() -> int:
+    """
+    Gets the work factor of new hashes: BCRYPT_ROUNDS if set, or else
+    calibrated once for BCRYPT_TARGET_MS (default: DEFAULT_TARGET_MS).
+
+    Returns:
+        int: The work factor.
+    """
+    rounds = os.getenv("BCRYPT_ROUNDS")
+    if rounds:
+        return int(rounds)
+    return calibrate_rounds(float(os.getenv("BCRYPT_TARGET_MS",
+                                            DEFAULT_TARGET_MS)))
+
 
 def hash_password(password: str) -> bytes:
     """
@@ -15,11 +66,26 @@ def hash_password(password: str) -> bytes:
         bytes: The encrypted password.
     """
     encoded_password = password.encode()
-    hashed_password = bcrypt.hashpw(encoded_password, bcrypt.gensalt())
+    salt = bcrypt.gensalt(default_rounds())
+    hashed_password = bcrypt.hashpw(encoded_password, salt)
 
     return hashed_password
 
 
+def needs_rehash(hashed_password: bytes) -> bool:
+    """
+    Checks if a hash uses a lower work factor than new hashes, so it
+    should be replaced by hash_password after a successful is_valid.
+
+    Args:
+        hashed_password (bytes): The hashed password ($2b$<rounds>$...).
+
+    Returns:
+        bool: True if the hash is outdated, False otherwise.
+    """
+    return int(hashed_password.split(b"$")[2]) < default_rounds()
+
+
 def is_valid(hashed_password: bytes, password: str) -> bool:
     """
     Validates a password by comparing it with a hashed password.
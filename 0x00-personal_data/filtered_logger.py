@@ -5,12 +5,82 @@ Contains a logger implementation that filters sensitive data.
 
 import os
 import re
+import sys
+import queue
+import atexit
+import shutil
 import logging
-from typing import List, Tuple
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+from logging.handlers import QueueHandler, QueueListener
+from typing import IO, Any, Callable, Iterable, List, Tuple
 
 import mysql.connector
 
 PII_FIELDS: Tuple[str] = ("name", "email", "phone", "ssn", "password")
+USER_COLUMNS: Tuple[str] = (
+    "name", "email", "phone", "ssn", "password", "ip", "last_login",
+    "user_agent"
+)
+USER_MESSAGE = " ".join("{}={{}};".format(column) for column in USER_COLUMNS)
+QUEUE_SIZE = 10000
+BATCH_SIZE = 1000
+POOL_SIZE = 5
+HEALTH_CHECK_INTERVAL = 1
+
+
+class Redactor:
+    """
+    Redacts the values of some fields in "key=value<separator>" messages,
+    with a pattern compiled once.
+    """
+
+    def __init__(self, fields: List[str], redaction: str, separator: str):
+        """
+        Compile the redaction pattern.
+
+        Args:
+            fields (List[str]): The fields to redact.
+            redaction (str): The replacement of their values.
+            separator (str): The separator of the fields.
+        """
+        self.keys = tuple("{}=".format(field) for field in fields)
+        self.pattern = re.compile(r"((?:{0})=)[^{1}]*{1}".format(
+            "|".join(re.escape(field) for field in fields),
+            re.escape(separator)))
+        self.replacement = r"\1{}{}".format(
+            redaction.replace("\\", r"\\"), separator.replace("\\", r"\\"))
+
+    def redact(self, message: str) -> str:
+        """
+        Redact a message in a single pass, or return it as is, without
+        running the pattern, when it holds none of the fields.
+
+        Args:
+            message (str): The message.
+
+        Returns:
+            str: The redacted message.
+        """
+        for key in self.keys:
+            if key in message:
+                return self.pattern.sub(self.replacement, message)
+        return message
+
+
+@lru_cache(maxsize=128)
+def get_redactor(
+    fields: Tuple[str], redaction: str, separator: str
+) -> Redactor:
+    """
+    Get the Redactor of a combination of fields, redaction and separator,
+    built on the first call only.
+    """
+    return Redactor(fields, redaction, separator)
 
 
 def filter_datum(
@@ -19,8 +89,7 @@ def filter_datum(
     """
     Filter sensitive data from a message.
     """
-    pattern = re.compile(r"({0}=)[^{1}]*({1})".format("|".join(fields), separator))
-    return pattern.sub(r"\1{}\2".format(redaction), message)
+    return get_redactor(tuple(fields), redaction, separator).redact(message)
 
 
 class RedactingFormatter(logging.Formatter):
@@ -42,6 +111,7 @@ class RedactingFormatter(logging.Formatter):
         """
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.redactor = Redactor(fields, self.REDACTION, self.SEPARATOR)
 
     def format(self, record: logging.LogRecord) -> str:
         """
@@ -54,26 +124,345 @@ class RedactingFormatter(logging.Formatter):
             str: The formatted log record with redacted sensitive data.
         """
         log = super(RedactingFormatter, self).format(record=record)
-        return filter_datum(self.fields, self.REDACTION, log, self.SEPARATOR)
+        return self.redactor.redact(log)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Queue handler that, when its bounded queue is full, either drops
+    the records (and counts them) or blocks until there is room.
+    """
+
+    def __init__(self, log_queue: queue.Queue, block: bool = False):
+        """
+        Initialize the BoundedQueueHandler object.
+
+        Args:
+            log_queue (queue.Queue): The bounded queue of the records.
+            block (bool): Whether to block, rather than drop the records,
+                when the queue is full.
+        """
+        super(BoundedQueueHandler, self).__init__(log_queue)
+        self.block = block
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """
+        Queue a record, or drop it if the queue is full and the handler
+        does not block (the handler lock is held).
+
+        Args:
+            record (logging.LogRecord): The log record.
+        """
+        try:
+            self.queue.put(record, block=self.block)
+        except queue.Full:
+            self.dropped += 1
 
 
-def get_logger() -> logging.Logger:
+class DrainingQueueListener(QueueListener):
+    """
+    Queue listener that, when stopped, writes out the records still
+    queued, even if the queue is full, and can be stopped twice.
+    """
+
+    def enqueue_sentinel(self) -> None:
+        """
+        Queue the stop sentinel after the records already queued.
+        """
+        self.queue.put(self._sentinel)
+
+    def stop(self) -> None:
+        """
+        Stop the listener thread, if running, once the queue is drained.
+        """
+        if self._thread is not None:
+            super(DrainingQueueListener, self).stop()
+
+
+def get_logger(
+    asynchronous: bool = False, queue_size: int = QUEUE_SIZE,
+    block: bool = False
+) -> logging.Logger:
     """
     Get a logger instance with a redacting formatter.
 
+    An asynchronous logger only queues the records: they are redacted
+    and written by a listener thread (stopped, once the queue is
+    drained, by stop_logger or at exit).
+
+    Args:
+        asynchronous (bool): Whether to redact and write the records on
+            a background thread.
+        queue_size (int): The maximum number of records waiting for the
+            background thread.
+        block (bool): Whether to block the caller, rather than drop its
+            records, when the queue is full.
+
     Returns:
         logging.Logger: The logger instance.
     """
     logger = logging.getLogger("user_data")
     handler = logging.StreamHandler()
     handler.setFormatter(RedactingFormatter(fields=PII_FIELDS))
+    if asynchronous:
+        log_queue = queue.Queue(maxsize=queue_size)
+        listener = DrainingQueueListener(log_queue, handler)
+        handler = BoundedQueueHandler(log_queue, block=block)
+        handler.listener = listener
+        listener.start()
+        atexit.register(listener.stop)
     logger.setLevel(logging.INFO)
     logger.propagate = False
     logger.addHandler(handler)
     return logger
 
 
-def get_db() -> mysql.connector.connection.MySQLConnection:
+def stop_logger(logger: logging.Logger) -> None:
+    """
+    Write out the records queued by an asynchronous logger and stop its
+    background threads. The logger then writes its records directly,
+    rather than queue them for a stopped thread.
+
+    Args:
+        logger (logging.Logger): The logger instance.
+    """
+    for handler in list(logger.handlers):
+        listener = getattr(handler, "listener", None)
+        if listener is None:
+            handler.flush()
+            continue
+        listener.stop()
+        logger.removeHandler(handler)
+        for target in listener.handlers:
+            target.flush()
+            logger.addHandler(target)
+
+
+class PooledConnection:
+    """
+    A connection checked out of a ConnectionPool, used like the
+    connection itself: closing it (or leaving its with block) returns
+    it to the pool.
+    """
+
+    def __init__(self, pool: "ConnectionPool", connection):
+        """
+        Initialize the PooledConnection object.
+
+        Args:
+            pool (ConnectionPool): The pool of the connection.
+            connection: The connection.
+        """
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name: str) -> Any:
+        """
+        Get an attribute of the connection.
+        """
+        if self._connection is None:
+            raise mysql.connector.errors.OperationalError(
+                "Connection returned to the pool")
+        return getattr(self._connection, name)
+
+    def close(self) -> None:
+        """
+        Return the connection to the pool (once).
+        """
+        if self._connection is not None:
+            self._pool.release(self._connection)
+            self._connection = None
+
+    def __enter__(self) -> "PooledConnection":
+        """
+        Use the connection in a with block.
+        """
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """
+        Return the connection to the pool at the end of the with block.
+        """
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Pool of at most size connections, opened on demand.
+
+    A checkout waits for a connection to be returned when they are all
+    in use (at most timeout seconds, if set). A connection idle for
+    more than HEALTH_CHECK_INTERVAL seconds is checked (pinged) before
+    being handed out, and replaced if it is dead. Returned connections
+    are rolled back, so that no transaction or unread result leaks to
+    the next user.
+    """
+
+    def __init__(self, connect: Callable, size: int = POOL_SIZE,
+                 timeout: float = None):
+        """
+        Initialize an empty pool.
+
+        Args:
+            connect (Callable): The function opening a connection.
+            size (int): The maximum number of connections.
+            timeout (float): The maximum wait of a checkout, in seconds
+                (default: no limit).
+        """
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self.in_use = 0
+        self.checkouts = 0
+        self.wait_time = 0.0
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    def checkout(self) -> PooledConnection:
+        """
+        Check a healthy connection out of the pool.
+
+        Returns:
+            PooledConnection: The connection.
+
+        Raises:
+            mysql.connector.errors.PoolError: If no connection was
+                returned within timeout seconds.
+        """
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise mysql.connector.errors.PoolError(
+                "No connection available after {}s".format(self.timeout))
+        waited = time.perf_counter() - start
+        try:
+            connection = self._healthy_connection()
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.wait_time += waited
+        return PooledConnection(self, connection)
+
+    def _healthy_connection(self):
+        """
+        Take the most recently used idle connection that is alive, or
+        open a new one (a slot is held).
+
+        Returns:
+            The connection.
+        """
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, last_used = self._idle.pop()
+            if (time.monotonic() - last_used < HEALTH_CHECK_INTERVAL
+                    or not hasattr(connection, "is_connected")
+                    or connection.is_connected()):
+                return connection
+            self._discard(connection)
+        return self.connect()
+
+    def release(self, connection) -> None:
+        """
+        Return a checked out connection to the pool.
+
+        Args:
+            connection: The connection.
+        """
+        try:
+            if getattr(connection, "unread_result", False):
+                connection.consume_results()
+            connection.rollback()
+        except Exception:
+            self._discard(connection)
+        else:
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+        with self._lock:
+            self.in_use -= 1
+        self._slots.release()
+
+    def _discard(self, connection) -> None:
+        """
+        Close a broken connection, ignoring errors.
+
+        Args:
+            connection: The connection.
+        """
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        """
+        Close the idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def stats(self) -> dict:
+        """
+        Get the statistics of the pool.
+
+        Returns:
+            dict: The size of the pool, the numbers of connections in use
+            and idle, the number of checkouts, and their total and mean
+            wait time (in seconds).
+        """
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "checkouts": self.checkouts,
+                "wait_time": self.wait_time,
+                "mean_wait_time": self.wait_time / (self.checkouts or 1),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Get the pool of connections to the personal data database of this
+    process, of PERSONAL_DATA_DB_POOL_SIZE connections (default:
+    POOL_SIZE).
+
+    Returns:
+        ConnectionPool: The pool.
+    """
+    global _pool
+    with _pool_lock:
+        # A forked worker (see export_partitioned) needs its own sockets
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = ConnectionPool(connect_db, size=int(
+                os.getenv("PERSONAL_DATA_DB_POOL_SIZE", POOL_SIZE)))
+        return _pool
+
+
+def get_db() -> PooledConnection:
+    """
+    Checks a connection to the personal data database out of the pool:
+    closing it returns it to the pool.
+
+    Returns:
+        The connection to the personal data database.
+    """
+    return get_pool().checkout()
+
+
+def connect_db() -> mysql.connector.connection.MySQLConnection:
     """
     Connects to the personal data database and returns a MySQLConnection object.
 
@@ -89,27 +478,267 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     return connector
 
 
+def write_users(
+    rows: Iterable[tuple], formatter: RedactingFormatter, stream: IO
+) -> None:
+    """
+    Redact a batch of users rows, as log lines of the same time, and
+    write them at once.
+
+    Args:
+        rows (Iterable[tuple]): The rows, with the USER_COLUMNS.
+        formatter (RedactingFormatter): The formatter of the lines.
+        stream (IO): The stream to write to.
+    """
+    prefix = formatter.format(logging.LogRecord(
+        "user_data", logging.INFO, None, None, "", None, None))
+    stream.write(formatter.redactor.redact("".join(
+        "{}{}\n".format(prefix, USER_MESSAGE.format(*row)) for row in rows)))
+    stream.flush()
+
+
+def _is_sqlite(db) -> bool:
+    """
+    Check if a connection, pooled or not, is a SQLite one.
+
+    Args:
+        db: The connection, or a PooledConnection.
+
+    Returns:
+        bool: True for SQLite, False for MySQL.
+    """
+    if isinstance(db, PooledConnection):
+        db = db._connection
+    return isinstance(db, sqlite3.Connection)
+
+
+def _cursor(db):
+    """
+    Open an unbuffered cursor on a MySQL connection, or a cursor on a
+    SQLite one (which never buffers).
+
+    Args:
+        db: The connection.
+
+    Returns:
+        The cursor.
+    """
+    if _is_sqlite(db):
+        return db.cursor()
+    return db.cursor(buffered=False)
+
+
+def _users_query(
+    db, column: str = None, low: Any = None, high: Any = None
+) -> Tuple[str, tuple]:
+    """
+    Build the query of the users rows, or of those whose column is in
+    [low, high) ordered by it (NULLs go with the first range).
+
+    Args:
+        db: The connection (for its placeholder style).
+        column (str): The column of the range.
+        low (Any): The lower bound of the range, None for no bound.
+        high (Any): The upper bound of the range, None for no bound.
+
+    Returns:
+        Tuple[str, tuple]: The query and its parameters.
+    """
+    query = "SELECT {} FROM users".format(", ".join(USER_COLUMNS))
+    if column is None:
+        return query, ()
+    if not re.fullmatch(r"\w+", column):
+        raise ValueError("Invalid column: {}".format(column))
+    mark = "?" if _is_sqlite(db) else "%s"
+    conditions, params = [], []
+    if low is not None:
+        conditions.append("{} >= {}".format(column, mark))
+        params.append(low)
+    if high is not None:
+        condition = "{} < {}".format(column, mark)
+        if low is None:
+            condition = "({} IS NULL OR {})".format(column, condition)
+        conditions.append(condition)
+        params.append(high)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return query + " ORDER BY {}".format(column), tuple(params)
+
+
+def export_users(
+    db: mysql.connector.connection.MySQLConnection, stream: IO = None,
+    batch_size: int = BATCH_SIZE, column: str = None, low: Any = None,
+    high: Any = None
+) -> int:
+    """
+    Stream the users table to a stream, redacted, batch_size rows at a
+    time: the rows are read from an unbuffered cursor, so memory use
+    does not grow with the table.
+
+    Args:
+        db: The connection to the personal data database (or to a SQLite
+            stand-in).
+        stream (IO): The stream to write to (default: stderr, like the
+            logger).
+        batch_size (int): The number of rows fetched and written at once.
+        column (str): The column to order the rows by, if any.
+        low (Any): The lowest value of column to export, if any.
+        high (Any): The value of column to export up to (excluded), if
+            any.
+
+    Returns:
+        int: The number of rows exported.
+    """
+    stream = stream or sys.stderr
+    formatter = RedactingFormatter(fields=PII_FIELDS)
+    cursor = _cursor(db)
+    count = 0
+    try:
+        cursor.execute(*_users_query(db, column, low, high))
+        rows = cursor.fetchmany(batch_size)
+        while rows:
+            write_users(rows, formatter, stream)
+            count += len(rows)
+            rows = cursor.fetchmany(batch_size)
+    finally:
+        cursor.close()
+    return count
+
+
+def partition_bounds(db, column: str, partitions: int) -> list:
+    """
+    Split the users table into partitions of about as many rows, by the
+    values of a column.
+
+    Args:
+        db: The connection to the personal data database.
+        column (str): The column to split on (the primary key or
+            last_login; better indexed).
+        partitions (int): The number of partitions.
+
+    Returns:
+        list: The increasing values of column starting each partition
+        but the first (fewer if values repeat).
+    """
+    if not re.fullmatch(r"\w+", column):
+        raise ValueError("Invalid column: {}".format(column))
+    cursor = _cursor(db)
+    bounds = []
+    try:
+        cursor.execute("SELECT COUNT({}) FROM users".format(column))
+        total = cursor.fetchall()[0][0]
+        for index in range(1, partitions):
+            cursor.execute(
+                "SELECT {0} FROM users WHERE {0} IS NOT NULL ORDER BY {0} "
+                "LIMIT 1 OFFSET {1}".format(
+                    column, total * index // partitions))
+            rows = cursor.fetchall()
+            if rows and rows[0][0] not in bounds[-1:]:
+                bounds.append(rows[0][0])
+    finally:
+        cursor.close()
+    return bounds
+
+
+def export_partition(
+    connect: Callable, path: str, batch_size: int, column: str, low: Any,
+    high: Any
+) -> int:
+    """
+    Export a range of the users table to a file, on its own connection.
+
+    Args:
+        connect (Callable): The function opening the connection.
+        path (str): The file to write to.
+        batch_size (int): The number of rows fetched and written at once.
+        column (str): The column of the range.
+        low (Any): The lower bound of the range, None for no bound.
+        high (Any): The upper bound of the range, None for no bound.
+
+    Returns:
+        int: The number of rows exported.
+    """
+    db = connect()
+    try:
+        with open(path, "w") as stream:
+            return export_users(db, stream, batch_size, column, low, high)
+    finally:
+        db.close()
+
+
+def export_partitioned(
+    output: str, connect: Callable = None, partitions: int = None,
+    column: str = "last_login", batch_size: int = BATCH_SIZE
+) -> int:
+    """
+    Export the users table, redacted and ordered by a column, to a file,
+    one partition of the table per worker process.
+
+    Each worker writes its partition to "<output>.<index>" on its own
+    connection, and the parts are merged into output in order.
+
+    Args:
+        output (str): The file to write to.
+        connect (Callable): The picklable function opening a connection
+            (default: get_db).
+        partitions (int): The number of partitions (default: the number
+            of CPUs).
+        column (str): The column to split the table on and order it by.
+        batch_size (int): The number of rows fetched and written at once.
+
+    Returns:
+        int: The number of rows exported.
+    """
+    connect = connect or get_db
+    partitions = partitions or os.cpu_count() or 1
+    db = connect()
+    try:
+        bounds = partition_bounds(db, column, partitions)
+    finally:
+        db.close()
+    lows, highs = [None] + bounds, bounds + [None]
+    paths = ["{}.{}".format(output, index) for index in range(len(lows))]
+    with ProcessPoolExecutor(max_workers=len(paths)) as pool:
+        count = sum(pool.map(export_partition, repeat(connect), paths,
+                             repeat(batch_size), repeat(column), lows, highs))
+    with open(output, "w") as merged:
+        for path in paths:
+            with open(path) as part:
+                shutil.copyfileobj(part, merged)
+            os.remove(path)
+    return count
+
+
 def main() -> None:
     """
     Main function to retrieve user data from the database and log it.
+
+    With PERSONAL_DATA_EXPORT=stream, the users are exported in batches
+    of PERSONAL_DATA_BATCH_SIZE rows (see export_users) instead of one
+    log call each. With PERSONAL_DATA_EXPORT=partitioned, they are
+    exported to PERSONAL_DATA_OUTPUT (default: users.log) in
+    PERSONAL_DATA_PARTITIONS partitions of PERSONAL_DATA_PARTITION_COLUMN
+    (default: last_login) exported in parallel (see export_partitioned).
     """
+    export = os.getenv("PERSONAL_DATA_EXPORT")
+    batch_size = int(os.getenv("PERSONAL_DATA_BATCH_SIZE", BATCH_SIZE))
+    if export == "partitioned":
+        export_partitioned(
+            os.getenv("PERSONAL_DATA_OUTPUT", "users.log"),
+            partitions=int(os.getenv("PERSONAL_DATA_PARTITIONS", 0)),
+            column=os.getenv("PERSONAL_DATA_PARTITION_COLUMN", "last_login"),
+            batch_size=batch_size)
+        return
     db = get_db()
+    if export == "stream":
+        export_users(db, batch_size=batch_size)
+        db.close()
+        return
     logger = get_logger()
     cursor = db.cursor()
-    cursor.execute("SELECT * FROM users")
-    rows = (row for row in cursor)
-    for row in rows:
-        msg = (
-            f"name={row[0]}\n"
-            f"email={row[1]}\n"
-            f"phone={row[2]}\n"
-            f"ssn={row[3]}\n"
-            f"password={row[4]}\n"
-            f"ip={row[5]}\n"
-            f"last_login={row[6]}\n"
-            f"user_agent={row[7]}\n"
-        )
-        logger.info(msg)
+    cursor.execute("SELECT {} FROM users".format(", ".join(USER_COLUMNS)))
+    for row in cursor:
+        logger.info(USER_MESSAGE.format(*row))
     cursor.close()
     db.close()
 
@@ -10,6 +10,7 @@ from flask_cors import CORS
 from api.v1.views import app_views
 from api.v1.auth.auth import Auth
 from api.v1.auth.basic_auth import BasicAuth
+from api.v1.auth.path_matcher import PathMatcher
 
 
 app = Flask(__name__)
@@ -25,6 +26,9 @@ if AUTH_TYPE == 'auth':
 elif AUTH_TYPE == 'basic_auth':
     auth = BasicAuth()
 
+excluded_paths = PathMatcher(
+    ['/api/v1/status/', '/api/v1/unauthorized/', '/api/v1/forbidden/'])
+
 
 @app.before_request
 def before_request():
@@ -32,12 +36,7 @@ def before_request():
     Before request handler.
     """
     if auth is not None:
-        excluded_list = ['/api/v1/status/', '/api/v1/unauthorized/', '/api/v1/forbidden/']
-        if auth.require_auth(request.path, excluded_list):
-            if auth.authorization_header(request) is None:
-                abort(401, description="Unauthorized")
-            if auth.current_user(request) is None:
-                abort(403, description='Forbidden')
+        auth.authenticate(request, excluded_paths)
 
 
 @app.errorhandler(404)
@@ -4,8 +4,19 @@ Module for authentication
 """
 
 
-from typing import Dict, TypeVar
-from flask import request
+from functools import lru_cache
+from typing import Dict, List, TypeVar, Union
+from flask import abort, request
+
+from api.v1.auth.path_matcher import PathMatcher
+
+_UNRESOLVED = object()
+
+
+@lru_cache(maxsize=32)
+def compile_paths(excluded_paths: tuple) -> PathMatcher:
+    """Compile a list of excluded paths, once per distinct list"""
+    return PathMatcher(excluded_paths)
 
 
 class Auth:
@@ -14,19 +25,23 @@ class Auth:
     def __init__(self):
         self.excluded_paths: Dict[str, bool] = {}
 
-    def require_auth(self, path: str) -> bool:
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], PathMatcher] = None
+                     ) -> bool:
         """Check if authentication is required for a given path"""
+        if excluded_paths is None:
+            excluded_paths = self.excluded_paths
+
         if path is None:
             return True
 
-        if not self.excluded_paths:
+        if not excluded_paths:
             return True
 
-        for excluded_path in self.excluded_paths:
-            if excluded_path == path or path.startswith(excluded_path):
-                return False
+        if not isinstance(excluded_paths, PathMatcher):
+            excluded_paths = compile_paths(tuple(excluded_paths))
 
-        return True
+        return not excluded_paths.matches(path)
 
     def authorization_header(self, req=None) -> str:
         """Get the authorization header from the request"""
@@ -43,3 +58,21 @@ class Auth:
     def current_user(self, req=None) -> TypeVar('User'):
         """Get the current user"""
         return None
+
+    def user_for_request(self, req) -> TypeVar('User'):
+        """Get the current user, resolved once and memoized on the request"""
+        user = getattr(req, 'current_user', _UNRESOLVED)
+        if user is _UNRESOLVED:
+            user = self.current_user(req)
+            setattr(req, 'current_user', user)
+        return user
+
+    def authenticate(self, req,
+                     excluded_paths: Union[List[str], PathMatcher]) -> None:
+        """Abort with 401/403 unless the request may access its path"""
+        if not self.require_auth(req.path, excluded_paths):
+            return
+        if self.authorization_header(req) is None:
+            abort(401, description="Unauthorized")
+        if self.user_for_request(req) is None:
+            abort(403, description='Forbidden')
@@ -4,6 +4,12 @@ Module for Basic authentication
 """
 
 import base64
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
 from typing import Optional, Tuple, TypeVar
 
 from api.v1.auth.auth import Auth
@@ -13,7 +19,22 @@ from models.user import User
 class BasicAuth(Auth):
     """
     Class for Basic authentication.
+
+    Verified credentials are cached by keyed hash of the Authorization
+    header, for CREDENTIALS_TTL seconds and up to CREDENTIALS_CACHE_SIZE
+    headers (LRU). Entries die with their user or its password.
     """
+    CREDENTIALS_TTL = 300
+    CREDENTIALS_CACHE_SIZE = 1024
+
+    def __init__(self):
+        """
+        Initializes the verified-credential cache.
+        """
+        super().__init__()
+        self._credentials_key = os.urandom(32)
+        self._credentials = OrderedDict()
+        self._credentials_lock = threading.Lock()
 
     def extract_base64_authorization_header(
             self, authorization_header: str) -> Optional[str]:
@@ -87,12 +108,52 @@ class BasicAuth(Auth):
         """
         auth_header = self.authorization_header(request)
         if auth_header:
+            key = hmac.new(self._credentials_key,
+                           auth_header.encode('utf-8'), sha256).digest()
+            user = self._cached_user(key)
+            if user:
+                return user
             token = self.extract_base64_authorization_header(auth_header)
             if token:
                 decoded = self.decode_base64_authorization_header(token)
                 if decoded:
                     email, password = self.extract_user_credentials(decoded)
                     if email:
-                        return self.user_object_from_credentials(email, password)
+                        user = self.user_object_from_credentials(email, password)
+                        if user:
+                            self._cache_user(key, user)
+                        return user
 
         return None
+
+    def _cached_user(self, key: bytes) -> Optional[TypeVar('User')]:
+        """
+        Retrieves the user of a cached header, if it is still valid.
+        """
+        with self._credentials_lock:
+            entry = self._credentials.get(key)
+            if entry is None:
+                return None
+            user_id, password, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._credentials[key]
+                return None
+            self._credentials.move_to_end(key)
+
+        user = User.get(user_id)
+        if user is None or user.password != password:
+            with self._credentials_lock:
+                self._credentials.pop(key, None)
+            return None
+        return user
+
+    def _cache_user(self, key: bytes, user: TypeVar('User')) -> None:
+        """
+        Caches the user a header was verified against.
+        """
+        expires_at = time.monotonic() + self.CREDENTIALS_TTL
+        with self._credentials_lock:
+            self._credentials[key] = (user.id, user.password, expires_at)
+            self._credentials.move_to_end(key)
+            while len(self._credentials) > self.CREDENTIALS_CACHE_SIZE:
+                self._credentials.popitem(last=False)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Module for the excluded-path matcher
+"""
+
+
+from functools import lru_cache
+from typing import Iterable
+
+
+class PathMatcher:
+    """Prefix trie of the paths excluded from authentication
+
+    "/api/v1/status/" matches "/api/v1/status", "/api/v1/status/" and
+    any path under it; a trailing "*" matches any continuation, so
+    "/api/v1/stat*" matches "/api/v1/stats". A path is matched in one
+    walk over its characters, and results are cached in a bounded LRU.
+    """
+
+    CACHE_SIZE = 1024
+
+    def __init__(self, patterns: Iterable[str]):
+        """Compile the patterns into a trie"""
+        self.patterns = tuple(patterns)
+        self.trie = {}
+        for pattern in self.patterns:
+            if not pattern:
+                continue
+            if pattern.endswith('*'):
+                pattern = pattern[:-1]
+            elif not pattern.endswith('/'):
+                pattern += '/'
+            node = self.trie
+            for char in pattern:
+                node = node.setdefault(char, {})
+            node[None] = True
+        self.matches = lru_cache(maxsize=self.CACHE_SIZE)(self._match)
+
+    def __bool__(self) -> bool:
+        """Check if at least one pattern was compiled"""
+        return bool(self.trie)
+
+    def _match(self, path: str) -> bool:
+        """Check if a path matches one of the patterns"""
+        if not path.endswith('/'):
+            path += '/'
+        node = self.trie
+        for char in path:
+            if None in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return None in node
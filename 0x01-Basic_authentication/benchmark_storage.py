@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Memory and lookup time of the User storage layouts: one object per
+user (default) against the ColumnStore (COMPACT_STORAGE = True).
+
+Usage: ./benchmark_storage.py [number_of_users]
+"""
+import sys
+import timeit
+import tracemalloc
+
+from models.user import User
+
+
+def fill(compact: bool, count: int) -> dict:
+    """Return a store of count users."""
+    User.COMPACT_STORAGE = compact
+    store = User._new_store()
+    for i in range(count):
+        user = User(email="user{}@example.com".format(i),
+                    first_name="Bob", last_name="Dylan")
+        user.password = "password{}".format(i)
+        store[user.id] = user
+        del user
+    return store
+
+
+def measure(compact: bool, count: int) -> int:
+    """Return the memory (in bytes) used to store count users."""
+    tracemalloc.start()
+    store = fill(compact, count)
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del store
+    return used
+
+
+def lookup_time(compact: bool, count: int) -> float:
+    """Return the mean time (in seconds) of a lookup by ID."""
+    store = fill(compact, count)
+    ids = list(store)
+    return timeit.timeit(lambda: [store[obj_id] for obj_id in ids],
+                         number=1) / count
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    objects = measure(False, count)
+    columns = measure(True, count)
+    print("users: {}".format(count))
+    print("objects: {:.1f} MB ({} bytes/user)".format(
+        objects / 1e6, objects // count))
+    print("columns: {:.1f} MB ({} bytes/user)".format(
+        columns / 1e6, columns // count))
+    print("saved: {:.0%}".format(1 - columns / objects))
+    print("lookup: objects {:.2f} us, columns {:.2f} us".format(
+        lookup_time(False, count) * 1e6, lookup_time(True, count) * 1e6))
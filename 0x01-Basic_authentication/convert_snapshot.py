@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Convert the User snapshot (.db_User.json or .db_User.bin) to another
+format, e.g. from the JSON files written so far to binary.
+
+Usage: ./convert_snapshot.py binary|json
+"""
+import sys
+from os import path
+
+from models.base import SERIALIZERS
+from models.user import User
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in SERIALIZERS:
+        print("Usage: {} {}".format(sys.argv[0], "|".join(SERIALIZERS)))
+        sys.exit(1)
+    source, _ = User._find_snapshot()
+    if source is None:
+        print("No snapshot to convert")
+        sys.exit(1)
+    source_size = path.getsize(source)
+    User.LAZY_LOAD = False
+    User.WRITE_BEHIND = False
+    User.load_from_file()
+    User.SNAPSHOT_FORMAT = sys.argv[1]
+    User.save_to_file()
+    target = User._snapshot_path(SERIALIZERS[sys.argv[1]])
+    print("{} ({} bytes) -> {} ({} bytes), {} objects".format(
+        source, source_size, target, path.getsize(target), User.count()))
@@ -1,37 +1,105 @@
 #!/usr/bin/env python3
 """ Base module
 """
-from datetime import datetime
+from array import array
+from collections.abc import MutableMapping
+from datetime import datetime, timedelta
 from typing import TypeVar, List, Iterable
-from os import path
+from os import path, remove, replace, fsync
+from contextlib import nullcontext
+import atexit
 import json
+import logging
+import threading
+import time
 import uuid
+import weakref
+
+from models.serializers import (BinarySerializer, JSONSerializer,
+                                is_binary_snapshot)
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+EPOCH = datetime(1970, 1, 1)
+SERIALIZERS = {
+    "json": JSONSerializer(TIMESTAMP_FORMAT),
+    "binary": BinarySerializer(),
+}
 DATA = {}
+INDEXES = {}
+INDEXED_VALUES = {}
+JOURNAL_SIZES = {}
+PENDING = {}
+FLUSHERS = {}
+LOADING = {}
+_LOCK = threading.RLock()
+_FILE_LOCK = threading.RLock()
+_UNHASHABLE = object()
+_MISSING = object()
+LOGGER = logging.getLogger(__name__)
 
 
 class Base():
     """ Base class
+
+    INDEXED_ATTRIBUTES lists the attributes kept in a secondary hash
+    index, so equality searches on them don't scan every object.
+
+    STORAGE_MODE is "snapshot" (rewrite the class file on every
+    save/remove) or "journal" (append one record per mutation to a log
+    replayed on load, compacted every JOURNAL_COMPACT_EVERY records).
+
+    WRITE_BEHIND makes save/remove only queue the mutation; a background
+    thread writes the queue out every FLUSH_INTERVAL seconds, or once
+    FLUSH_THRESHOLD mutations are pending.
+
+    LAZY_LOAD makes load_from_file return right away while a background
+    thread streams the snapshot; objects stay serialized (timestamps
+    unparsed) until first accessed.
+
+    COMPACT_STORAGE keeps the objects of the class in a ColumnStore (one
+    column per attribute, packed strings, integer timestamps) instead
+    of one object each: about 40% less memory, slower lookups.
+
+    SNAPSHOT_FORMAT is the key in SERIALIZERS of the format snapshots
+    are saved in: "json" (.db_<Class>.json) or "binary" (.db_<Class>.bin).
+    The format of the loaded file is detected from its content, so
+    changing it converts the snapshot on the next save.
+
+    Durability: snapshots go to a temporary file that is synced and
+    renamed over the old one, so a crash leaves the old or the new
+    snapshot. Without WRITE_BEHIND a mutation is on disk when save() or
+    remove() returns; with it, up to FLUSH_INTERVAL seconds (or
+    FLUSH_THRESHOLD mutations) can be lost on a crash. Pending mutations
+    are flushed at exit and by flush(); a failed background flush is
+    logged and retried, its mutations staying queued.
     """
 
+    INDEXED_ATTRIBUTES = ()
+    STORAGE_MODE = "snapshot"
+    JOURNAL_COMPACT_EVERY = 1000
+    WRITE_BEHIND = False
+    FLUSH_INTERVAL = 1.0
+    FLUSH_THRESHOLD = 100
+    LAZY_LOAD = False
+    COMPACT_STORAGE = False
+    SNAPSHOT_FORMAT = "json"
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
         if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+            DATA[s_class] = self.__class__._new_store()
+            self.__class__._reset_indexes()
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = _parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = _parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
@@ -59,53 +127,318 @@ class Base():
 
     @classmethod
     def load_from_file(cls):
-        """ Load all objects from file
+        """ Load all objects from file, then replay the journal
+
+            With LAZY_LOAD the load runs in the background: loaded IDs
+            are served right away, and what needs the whole set (count,
+            search, misses, writes) waits for the load to finish.
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
+        cls._wait_loaded()
+        cls.flush()
+        JOURNAL_SIZES[s_class] = 0
+
+        if cls.LAZY_LOAD:
+            DATA[s_class] = cls._new_store(lazy=True)
+            cls._reset_indexes()
+            loaded = threading.Event()
+            LOADING[s_class] = loaded
+            threading.Thread(target=cls._stream_from_file,
+                             args=(loaded,), daemon=True).start()
             return
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        DATA[s_class] = cls._new_store()
+        cls._reset_indexes()
+        file_path, serializer = cls._find_snapshot()
+        if file_path is not None:
+            with open(file_path, 'rb' if serializer.BINARY else 'r') as f:
+                for obj_id, obj_json in serializer.load(f):
+                    DATA[s_class][obj_id] = cls(**obj_json)
+        cls._replay_journal()
+        cls._reset_indexes()
+
+    @classmethod
+    def _snapshot_path(cls, serializer) -> str:
+        """ Path of the snapshot of the class in the format of one of
+            the SERIALIZERS, e.g. ".db_User.json"
+        """
+        return ".db_{}.{}".format(cls.__name__, serializer.EXTENSION)
+
+    @classmethod
+    def _find_snapshot(cls) -> tuple:
+        """ Most recent snapshot of the class in any format, and the
+            serializer matching its content ((None, None) if none)
+        """
+        paths = [cls._snapshot_path(serializer)
+                 for serializer in SERIALIZERS.values()]
+        paths = [file_path for file_path in paths if path.exists(file_path)]
+        if not paths:
+            return (None, None)
+        file_path = max(paths, key=path.getmtime)
+        if is_binary_snapshot(file_path):
+            return (file_path, SERIALIZERS["binary"])
+        return (file_path, SERIALIZERS["json"])
+
+    @classmethod
+    def _new_store(cls, lazy: bool = False) -> dict:
+        """ Empty mapping of IDs to objects for DATA: a ColumnStore, a
+            LazyObjects (lazy: serialized objects will be added) or a dict
+        """
+        if cls.COMPACT_STORAGE:
+            return ColumnStore(cls)
+        if lazy:
+            return LazyObjects(cls)
+        return {}
+
+    @classmethod
+    def _stream_from_file(cls, loaded: threading.Event):
+        """ Lazy loader thread: stream the snapshot into DATA in batches
+            of serialized objects, replay the journal, then set loaded
+        """
+        s_class = cls.__name__
+        file_path, serializer = cls._find_snapshot()
+        objs = DATA[s_class]
+        try:
+            if file_path is not None:
+                mode = 'rb' if serializer.BINARY else 'r'
+                with open(file_path, mode) as f:
+                    batch = []
+                    for obj_id, obj_json in serializer.load(f, stream=True):
+                        batch.append((obj_id, obj_json))
+                        if len(batch) >= 1000:
+                            cls._load_batch(objs, batch)
+                            batch = []
+                            # Let request threads take the lock
+                            time.sleep(0)
+                    cls._load_batch(objs, batch)
+            with _FILE_LOCK, _LOCK:
+                cls._replay_journal()
+                cls._reset_indexes()
+        finally:
+            loaded.set()
+
+    @classmethod
+    def _load_batch(cls, objs: dict, batch: list):
+        """ Add (ID, serialized object) pairs to DATA and the indexes
+        """
+        with _LOCK:
+            for obj_id, obj_json in batch:
+                objs[obj_id] = obj_json
+                cls._index_put(obj_id, obj_json)
+
+    @classmethod
+    def _wait_loaded(cls) -> bool:
+        """ Wait for a background load of the class to finish
+            (True if one was in progress)
+        """
+        loaded = LOADING.get(cls.__name__)
+        if loaded is None or loaded.is_set():
+            return False
+        loaded.wait()
+        return True
+
+    @classmethod
+    def _replay_journal(cls):
+        """ Apply the records of the journal file to DATA
+            (a torn last line is dropped and the journal compacted)
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        if not path.exists(journal_path):
+            return
+
+        torn = False
+        with open(journal_path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    torn = True
+                    break
+                if record.get("op") == "save":
+                    DATA[s_class][record["id"]] = cls(**record["obj"])
+                else:
+                    DATA[s_class].pop(record["id"], None)
+                JOURNAL_SIZES[s_class] += 1
+                torn = not line.endswith("\n")
+        if torn:
+            cls.save_to_file()
 
     @classmethod
     def save_to_file(cls):
-        """ Save all objects to file
+        """ Save all objects to file in the SNAPSHOT_FORMAT of the class
+            (clears the write-behind queue, the journal and the snapshots
+            in other formats, which this one covers)
+        """
+        s_class = cls.__name__
+        serializer = SERIALIZERS[cls.SNAPSHOT_FORMAT]
+        file_path = cls._snapshot_path(serializer)
+        with _FILE_LOCK:
+            with _LOCK:
+                serialized = []
+                # Objects not built yet are saved in serialized form
+                for obj_id, obj in _raw_items(DATA[s_class]):
+                    if type(obj) is not dict:
+                        obj = serializer.serialize(obj)
+                    serialized.append((obj_id, obj))
+                PENDING.pop(s_class, None)
+
+            tmp_path = file_path + ".tmp"
+            with open(tmp_path, 'wb' if serializer.BINARY else 'w') as f:
+                serializer.dump(serialized, f)
+                f.flush()
+                fsync(f.fileno())
+            replace(tmp_path, file_path)
+            for other in SERIALIZERS.values():
+                other_path = cls._snapshot_path(other)
+                if other_path != file_path and path.exists(other_path):
+                    remove(other_path)
+
+            # The snapshot now holds every mutation of the journal
+            journal_path = ".db_{}.journal".format(s_class)
+            if path.exists(journal_path):
+                remove(journal_path)
+            JOURNAL_SIZES[s_class] = 0
+
+    @classmethod
+    def _append_journal(cls, records: List[dict]):
+        """ Append mutation records to the journal in one write,
+            compacting it into the snapshot once it is long enough
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        with _FILE_LOCK:
+            with open(journal_path, 'a') as f:
+                f.write("".join(json.dumps(r) + "\n" for r in records))
+            JOURNAL_SIZES[s_class] = \
+                JOURNAL_SIZES.get(s_class, 0) + len(records)
+            if JOURNAL_SIZES[s_class] >= cls.JOURNAL_COMPACT_EVERY:
+                cls.save_to_file()
+
+    @classmethod
+    def flush(cls):
+        """ Write out the write-behind queue, as one snapshot or one
+            group commit to the journal
+        """
+        s_class = cls.__name__
+        with _FILE_LOCK:
+            with _LOCK:
+                records = PENDING.pop(s_class, None)
+            if not records:
+                return
+            try:
+                if cls.STORAGE_MODE == "journal":
+                    cls._append_journal(records)
+                else:
+                    cls.save_to_file()
+            except Exception:
+                with _LOCK:
+                    PENDING[s_class] = records + PENDING.get(s_class, [])
+                raise
+
+    @classmethod
+    def _start_flusher(cls) -> threading.Event:
+        """ Start the background flusher of the class if needed, and
+            return the event that wakes it up
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        with _LOCK:
+            if s_class in FLUSHERS:
+                return FLUSHERS[s_class][1]
+            wake = threading.Event()
+            FLUSHERS[s_class] = (cls, wake)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        def _flush_loop():
+            # The error of the failing flushes, logged once: their
+            # mutations stay queued for the next flush
+            failure = None
+            while True:
+                wake.wait(cls.FLUSH_INTERVAL)
+                wake.clear()
+                try:
+                    cls.flush()
+                except Exception as error:
+                    if repr(error) != failure:
+                        failure = repr(error)
+                        LOGGER.exception("Flushing %s failed, retrying",
+                                         s_class)
+                    continue
+                if failure is not None:
+                    failure = None
+                    LOGGER.warning("Flushing %s works again", s_class)
+
+        threading.Thread(target=_flush_loop, daemon=True).start()
+        return wake
+
+    @classmethod
+    def _write_lock(cls):
+        """ Lock held across a mutation written out synchronously, so
+            the file sees mutations in memory order
+        """
+        if cls.WRITE_BEHIND:
+            return nullcontext()
+        return _FILE_LOCK
+
+    def _record(self, op: str) -> dict:
+        """ Persistence record of a mutation ("save" or "remove")
+        """
+        record = {"op": op, "id": self.id}
+        if op == "save" and self.__class__.STORAGE_MODE == "journal":
+            record["obj"] = self.to_json(True)
+        return record
+
+    @classmethod
+    def _persist(cls, record: dict):
+        """ Persist a mutation record, or queue it when writing behind
+        """
+        s_class = cls.__name__
+        if cls.WRITE_BEHIND:
+            wake = cls._start_flusher()
+            with _LOCK:
+                pending = PENDING.setdefault(s_class, [])
+                pending.append(record)
+                if len(pending) >= cls.FLUSH_THRESHOLD:
+                    wake.set()
+        elif cls.STORAGE_MODE == "journal":
+            cls._append_journal([record])
+        else:
+            cls.save_to_file()
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        cls = self.__class__
+        s_class = cls.__name__
+        cls._wait_loaded()
+        with cls._write_lock():
+            with _LOCK:
+                self.updated_at = datetime.utcnow()
+                DATA[s_class][self.id] = self
+                cls._index_add(self)
+                record = self._record("save")
+            cls._persist(record)
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        cls = self.__class__
+        s_class = cls.__name__
+        cls._wait_loaded()
+        with cls._write_lock():
+            with _LOCK:
+                if DATA[s_class].get(self.id) is None:
+                    return
+                del DATA[s_class][self.id]
+                cls._index_discard(self.id)
+                record = self._record("remove")
+            cls._persist(record)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
         s_class = cls.__name__
+        cls._wait_loaded()
         return len(DATA[s_class].keys())
 
     @classmethod
@@ -119,7 +452,10 @@ class Base():
         """ Return one object by ID
         """
         s_class = cls.__name__
-        return DATA[s_class].get(id)
+        obj = DATA[s_class].get(id)
+        if obj is None and cls._wait_loaded():
+            obj = DATA[s_class].get(id)
+        return obj
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
@@ -133,5 +469,467 @@ class Base():
                 if (getattr(obj, k) != v):
                     return False
             return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+
+        cls._wait_loaded()
+        objs = DATA[s_class]
+        obj_ids = cls._index_candidates(attributes)
+        if obj_ids is None:
+            candidates = objs.values()
+        else:
+            candidates = [objs[obj_id] for obj_id in obj_ids
+                          if obj_id in objs]
+        return list(filter(_search, candidates))
+
+    @classmethod
+    def _reset_indexes(cls):
+        """ Rebuild the secondary indexes of the class from DATA
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {attr: {} for attr in cls.INDEXED_ATTRIBUTES}
+        INDEXED_VALUES[s_class] = {}
+        for obj_id, obj in _raw_items(DATA.get(s_class, {})):
+            if type(obj) is dict:
+                cls._index_put(obj_id, obj)
+            else:
+                cls._index_add(obj)
+
+    @classmethod
+    def _index_add(cls, obj: TypeVar('Base')):
+        """ Index (or re-index) an object under its current values
+        """
+        if not cls.INDEXED_ATTRIBUTES:
+            return
+        values = {attr: getattr(obj, attr, None)
+                  for attr in cls.INDEXED_ATTRIBUTES}
+        cls._index_put(obj.id, values)
+
+    @classmethod
+    def _index_put(cls, obj_id: str, values: dict):
+        """ Index an object ID under the given attribute values
+            (extra keys, as in a serialized object, are ignored)
+        """
+        s_class = cls.__name__
+        if not cls.INDEXED_ATTRIBUTES:
+            return
+        if s_class not in INDEXES:
+            cls._reset_indexes()
+        values = {attr: values.get(attr) for attr in cls.INDEXED_ATTRIBUTES}
+        previous = INDEXED_VALUES[s_class].get(obj_id)
+        if previous is not None:
+            if previous == values:
+                return
+            cls._index_discard(obj_id)
+        for attr, value in values.items():
+            bucket_key = _index_key(value)
+            INDEXES[s_class][attr].setdefault(bucket_key, {})[obj_id] = None
+        INDEXED_VALUES[s_class][obj_id] = values
+
+    @classmethod
+    def _index_discard(cls, obj_id: str):
+        """ Remove an object ID from the secondary indexes
+        """
+        s_class = cls.__name__
+        values = INDEXED_VALUES.get(s_class, {}).pop(obj_id, None)
+        if values is None:
+            return
+        for attr, value in values.items():
+            index = INDEXES[s_class][attr]
+            bucket_key = _index_key(value)
+            bucket = index.get(bucket_key)
+            if bucket is None:
+                continue
+            bucket.pop(obj_id, None)
+            if not bucket:
+                del index[bucket_key]
+
+    @classmethod
+    def _index_candidates(cls, attributes: dict) -> List[str]:
+        """ IDs of the objects that may match, from the indexes
+            (None when a full scan is needed)
+        """
+        indexes = INDEXES.get(cls.__name__)
+        if not indexes or not attributes:
+            return None
+        best = None
+        for k, v in attributes.items():
+            index = indexes.get(k)
+            if index is None:
+                continue
+            bucket_key = _index_key(v)
+            if bucket_key is _UNHASHABLE:
+                continue
+            bucket = list(index.get(bucket_key, {}))
+            bucket.extend(index.get(_UNHASHABLE, {}))
+            if best is None or len(bucket) < len(best):
+                best = bucket
+        return best
+
+
+class LazyObjects(dict):
+    """ Mapping of IDs to objects that holds lazily loaded objects in
+        their serialized form and builds each one on first access
+    """
+
+    def __init__(self, cls: type):
+        """ Initialize an empty mapping for a model class
+        """
+        super().__init__()
+        self.cls = cls
+
+    def _materialize(self, obj_id: str, obj):
+        """ Build (once) the object stored under an ID
+        """
+        if type(obj) is not dict:
+            return obj
+        built = self.cls(**obj)
+        # Don't overwrite an object saved, removed or built meanwhile
+        current = dict.get(self, obj_id)
+        if current is obj:
+            dict.__setitem__(self, obj_id, built)
+            return built
+        return self._materialize(obj_id, current)
+
+    def __getitem__(self, obj_id: str) -> TypeVar('Base'):
+        """ Object stored under an ID
+        """
+        return self._materialize(obj_id, dict.__getitem__(self, obj_id))
+
+    def get(self, obj_id: str, default=None) -> TypeVar('Base'):
+        """ Object stored under an ID, or default
+        """
+        if obj_id not in self:
+            return default
+        return self[obj_id]
+
+    def pop(self, obj_id: str, *default) -> TypeVar('Base'):
+        """ Remove and return the object stored under an ID
+        """
+        obj = dict.pop(self, obj_id, *default)
+        if type(obj) is dict:
+            obj = self.cls(**obj)
+        return obj
+
+    def values(self) -> List[TypeVar('Base')]:
+        """ All the objects, built
+        """
+        return [self[obj_id] for obj_id in list(self)]
+
+    def items(self) -> List[tuple]:
+        """ All the (ID, object) pairs, objects built
+        """
+        return [(obj_id, self[obj_id]) for obj_id in list(self)]
+
+    def raw_items(self) -> List[tuple]:
+        """ All the (ID, object) pairs, unbuilt ones serialized
+        """
+        return list(dict.items(self))
+
+
+class ColumnStore(MutableMapping):
+    """ Compact mapping of IDs to objects: each attribute is kept in a
+        column (a PackedColumn, or an array of microseconds since the
+        epoch for timestamps) instead of a __dict__ per object
+
+        Objects are built on access, so reads are slower than with a
+        dict. Objects built (or stored) are tracked by ID while they are
+        referenced anywhere: until then every lookup returns the same
+        object, and its unsaved changes are seen by later lookups and
+        written by the next snapshot, as with a dict. Unsaved changes to
+        an object no longer referenced are lost.
+    """
+
+    TIMESTAMP_ATTRIBUTES = ("created_at", "updated_at")
+    NULL_TIMESTAMP = -2 ** 63
+
+    def __init__(self, cls: type):
+        """ Initialize an empty store for a model class
+        """
+        self.cls = cls
+        self.rows = {}
+        self.ids = []
+        self.columns = {}
+        self.live = weakref.WeakValueDictionary()
+
+    def __len__(self) -> int:
+        """ Number of objects
+        """
+        return len(self.rows)
+
+    def __iter__(self):
+        """ Iterate over the object IDs
+        """
+        return iter(list(self.rows))
+
+    def __contains__(self, obj_id: str) -> bool:
+        """ Is an object stored under this ID
+        """
+        return obj_id in self.rows
+
+    def __getitem__(self, obj_id: str) -> TypeVar('Base'):
+        """ Object stored under an ID, built unless still referenced
+        """
+        with _LOCK:
+            row = self.rows[obj_id]
+            obj = self.live.get(obj_id)
+            if obj is not None:
+                return obj
+            obj = self.cls.__new__(self.cls)
+            attributes = obj.__dict__
+            attributes['id'] = obj_id
+            for key, column in self.columns.items():
+                value = column[row]
+                if key in self.TIMESTAMP_ATTRIBUTES:
+                    value = self._to_datetime(value)
+                if value is not _MISSING:
+                    attributes[key] = value
+            self.live[obj_id] = obj
+        return obj
+
+    def __setitem__(self, obj_id: str, obj):
+        """ Store an object, or its serialized form, under an ID
+        """
+        values = obj if type(obj) is dict else obj.__dict__
+        with _LOCK:
+            if type(obj) is dict:
+                self.live.pop(obj_id, None)
+            else:
+                self.live[obj_id] = obj
+            row = self.rows.get(obj_id)
+            if row is None:
+                row = len(self.ids)
+                self.rows[obj_id] = row
+                self.ids.append(obj_id)
+                for key, column in self.columns.items():
+                    column.append(self._missing(key))
+            for key in values:
+                if key != 'id' and key not in self.columns:
+                    self.columns[key] = self._new_column(key)
+            for key, column in self.columns.items():
+                value = values.get(key, _MISSING)
+                if key in self.TIMESTAMP_ATTRIBUTES:
+                    value = self._to_micros(value)
+                column[row] = value
+
+    def __delitem__(self, obj_id: str):
+        """ Remove the object stored under an ID (the last row is moved
+            in its place)
+        """
+        with _LOCK:
+            row = self.rows.pop(obj_id)
+            self.live.pop(obj_id, None)
+            last = len(self.ids) - 1
+            if row != last:
+                last_id = self.ids[last]
+                self.ids[row] = last_id
+                self.rows[last_id] = row
+                for column in self.columns.values():
+                    column[row] = column[last]
+            self.ids.pop()
+            for column in self.columns.values():
+                column.pop()
+
+    def values(self) -> List[TypeVar('Base')]:
+        """ All the objects, built
+        """
+        return [self[obj_id] for obj_id in self]
+
+    def items(self) -> List[tuple]:
+        """ All the (ID, object) pairs, objects built
+        """
+        return [(obj_id, self[obj_id]) for obj_id in self]
+
+    def raw_items(self) -> List[tuple]:
+        """ All the (ID, object) pairs, serialized unless the object is
+            still referenced
+        """
+        with _LOCK:
+            items = []
+            for obj_id, row in self.rows.items():
+                obj = self.live.get(obj_id)
+                if obj is not None:
+                    items.append((obj_id, obj))
+                    continue
+                obj_json = {'id': obj_id}
+                for key, column in self.columns.items():
+                    value = column[row]
+                    if key in self.TIMESTAMP_ATTRIBUTES:
+                        value = self._to_datetime(value)
+                        if type(value) is datetime:
+                            value = value.strftime(TIMESTAMP_FORMAT)
+                    if value is not _MISSING:
+                        obj_json[key] = value
+                items.append((obj_id, obj_json))
+        return items
+
+    def _new_column(self, key: str):
+        """ Column for a new attribute, for all existing rows
+        """
+        if key in self.TIMESTAMP_ATTRIBUTES:
+            return array('q', [self.NULL_TIMESTAMP] * len(self.ids))
+        return PackedColumn(len(self.ids))
+
+    def _missing(self, key: str):
+        """ Value of a missing attribute in a column
+        """
+        if key in self.TIMESTAMP_ATTRIBUTES:
+            return self.NULL_TIMESTAMP
+        return _MISSING
+
+    def _to_micros(self, value) -> int:
+        """ Column value of a datetime (or serialized timestamp)
+        """
+        if type(value) is str:
+            value = _parse_timestamp(value)
+        if type(value) is not datetime:
+            return self.NULL_TIMESTAMP
+        return (value - EPOCH) // timedelta(microseconds=1)
+
+    def _to_datetime(self, value: int):
+        """ datetime of a timestamp column value
+        """
+        if value == self.NULL_TIMESTAMP:
+            return _MISSING
+        return EPOCH + timedelta(microseconds=value)
+
+
+class PackedColumn:
+    """ Column of attribute values, used like a list, in which strings
+        are packed UTF-8 encoded in a single bytearray: a string costs its
+        encoded length plus 12 bytes (offset and length) instead of an
+        object of about 50 bytes plus its length and a list slot. None
+        and missing values are flagged in the length; other values are
+        kept aside by row
+
+        Overwritten and removed strings leave garbage in the bytearray,
+        compacted once it outweighs the live strings.
+    """
+
+    MISSING = 0xFFFFFFFF
+    NONE = 0xFFFFFFFE
+    OTHER = 0xFFFFFFFD
+    COMPACT_MIN = 4096
+
+    def __init__(self, length: int = 0):
+        """ Initialize a column of length missing values
+        """
+        self.data = bytearray()
+        self.starts = array('Q', [0] * length)
+        self.lengths = array('I', [self.MISSING] * length)
+        self.others = {}
+        self.garbage = 0
+
+    def __len__(self) -> int:
+        """ Number of rows
+        """
+        return len(self.lengths)
+
+    def __getitem__(self, row: int):
+        """ Value of a row (_MISSING if none)
+        """
+        length = self.lengths[row]
+        if length < self.OTHER:
+            start = self.starts[row]
+            return self.data[start:start + length].decode(
+                'utf-8', 'surrogatepass')
+        if length == self.MISSING:
+            return _MISSING
+        if length == self.NONE:
+            return None
+        return self.others[row]
+
+    def __setitem__(self, row: int, value):
+        """ Set the value of a row
+        """
+        self._release(row)
+        if type(value) is str:
+            encoded = value.encode('utf-8', 'surrogatepass')
+            if len(encoded) < self.OTHER:
+                self.starts[row] = len(self.data)
+                self.lengths[row] = len(encoded)
+                self.data += encoded
+                self._compact()
+                return
+        if value is _MISSING:
+            self.lengths[row] = self.MISSING
+        elif value is None:
+            self.lengths[row] = self.NONE
+        else:
+            self.lengths[row] = self.OTHER
+            self.others[row] = value
+
+    def append(self, value):
+        """ Add a row
+        """
+        self.starts.append(0)
+        self.lengths.append(self.MISSING)
+        self[len(self.lengths) - 1] = value
+
+    def pop(self):
+        """ Remove the last row
+        """
+        row = len(self.lengths) - 1
+        self._release(row)
+        self.starts.pop()
+        self.lengths.pop()
+
+    def _release(self, row: int):
+        """ Forget the value of a row
+        """
+        length = self.lengths[row]
+        if length < self.OTHER:
+            self.garbage += length
+        elif length == self.OTHER:
+            del self.others[row]
+
+    def _compact(self):
+        """ Rewrite the bytearray without garbage, if mostly garbage
+        """
+        if (self.garbage < self.COMPACT_MIN
+                or self.garbage * 2 < len(self.data)):
+            return
+        data = bytearray()
+        for row, length in enumerate(self.lengths):
+            if length < self.OTHER:
+                start = self.starts[row]
+                self.starts[row] = len(data)
+                data += self.data[start:start + length]
+        self.data = data
+        self.garbage = 0
+
+
+def _parse_timestamp(value) -> datetime:
+    """ datetime of a serialized timestamp: a string in TIMESTAMP_FORMAT,
+        or a datetime as read from a binary snapshot
+    """
+    if type(value) is datetime:
+        return value
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def _raw_items(objs) -> Iterable[tuple]:
+    """ (ID, object) pairs of a DATA mapping, without building the
+        objects only held in serialized form
+    """
+    raw_items = getattr(objs, "raw_items", None)
+    if raw_items is None:
+        return objs.items()
+    return raw_items()
+
+
+def _index_key(value):
+    """ Key of a value in an index: unhashable values share one
+        bucket that the search filter always re-checks
+    """
+    try:
+        hash(value)
+    except TypeError:
+        return _UNHASHABLE
+    return value
+
+
+@atexit.register
+def flush_all():
+    """ Flush the write-behind queue of every class (run at exit)
+    """
+    for cls, _ in list(FLUSHERS.values()):
+        cls.flush()
@@ -7,6 +7,7 @@ from os import getenv
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
+from api.v1.auth.path_matcher import PathMatcher
 import os
 
 
@@ -27,6 +28,13 @@ elif auth_type == 'basic_auth':
 elif auth_type == 'session_auth':
     from api.v1.auth.session_auth import SessionAuth
     auth = SessionAuth()
+elif auth_type == 'session_token_auth':
+    from api.v1.auth.session_token_auth import SessionTokenAuth
+    auth = SessionTokenAuth()
+
+excluded_paths = PathMatcher(['/api/v1/status/',
+                              '/api/v1/unauthorized/', '/api/v1/forbidden/',
+                              '/api/v1/auth_session/login/'])
 
 
 @app.before_request
@@ -35,20 +43,8 @@ def before_request():
     This function is executed before each request to the API.
     It handles authentication and authorization.
     """
-    if auth is None:
-        pass
-    else:
-        setattr(request, "current_user", auth.current_user(request))
-        excluded_list = ['/api/v1/status/',
-                         '/api/v1/unauthorized/', '/api/v1/forbidden/',
-                         '/api/v1/auth_session/login/']
-
-        if auth.require_auth(request.path, excluded_list):
-            cookie = auth.session_cookie(request)
-            if auth.authorization_header(request) is None and cookie is None:
-                abort(401, description="Unauthorized")
-            if auth.current_user(request) is None:
-                abort(403, description='Forbidden')
+    if auth is not None:
+        auth.authenticate(request, excluded_paths)
 
 
 @app.errorhandler(404)
@@ -4,23 +4,43 @@ Authentication module
 """
 
 
-from typing import List, TypeVar
-from flask import request
+from functools import lru_cache
+from typing import List, TypeVar, Union
+from flask import abort, request
+from api.v1.auth.path_matcher import PathMatcher
 import os
 
 User = TypeVar('User')
 
+_UNRESOLVED = object()
+
+
+@lru_cache(maxsize=32)
+def compile_paths(excluded_paths: tuple) -> PathMatcher:
+    """Compile (once per distinct list) the paths excluded from auth
+
+    Args:
+        excluded_paths (tuple): The excluded paths
+
+    Returns:
+        PathMatcher: The compiled matcher
+    """
+    return PathMatcher(excluded_paths)
+
 
 class Auth:
     """Authentication class
     """
 
-    def is_auth_required(self, path: str, excluded_paths: List[str]) -> bool:
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], PathMatcher]) -> bool:
         """Check if authentication is required for the given path
 
         Args:
             path (str): The path to check
-            excluded_paths (List[str]): List of paths that are excluded from authentication
+            excluded_paths (List[str] | PathMatcher): List of paths that
+                are excluded from authentication, or the PathMatcher
+                compiled from it (see PathMatcher for the matching rules)
 
         Returns:
             bool: True if authentication is required, False otherwise
@@ -28,21 +48,15 @@ class Auth:
         if path is None:
             return True
 
-        if excluded_paths is None or excluded_paths == []:
+        if not excluded_paths:
             return True
 
-        if path in excluded_paths:
-            return False
+        if not isinstance(excluded_paths, PathMatcher):
+            excluded_paths = compile_paths(tuple(excluded_paths))
 
-        for excluded_path in excluded_paths:
-            if (
-                excluded_path.startswith(path)
-                or path.startswith(excluded_path)
-                or (excluded_path[-1] == "*" and path.startswith(excluded_path[:-1]))
-            ):
-                return False
+        return not excluded_paths.matches(path)
 
-        return True
+    is_auth_required = require_auth
 
     def authorization_header(self, request=None) -> str:
         """Get the authorization header from the request
@@ -74,6 +88,47 @@ class Auth:
         """
         return None
 
+    def user_for_request(self, request) -> User:
+        """Get the current user, resolved once per request
+
+        The first call resolves the credentials with current_user and
+        memoizes the result on the request as request.current_user, so
+        decoding, lookup and password hashing happen once per request.
+
+        Args:
+            request (Request): The request object.
+
+        Returns:
+            User: The current user
+        """
+        user = getattr(request, "current_user", _UNRESOLVED)
+        if user is _UNRESOLVED:
+            user = self.current_user(request)
+            setattr(request, "current_user", user)
+        return user
+
+    def authenticate(self, request,
+                     excluded_paths: Union[List[str], PathMatcher]) -> None:
+        """Authenticate a request, meant to be called from before_request
+
+        Sets request.current_user and aborts with 401 when a protected
+        path is requested without credentials, or 403 when the
+        credentials do not match a user.
+
+        Args:
+            request (Request): The request object.
+            excluded_paths (List[str] | PathMatcher): Paths that are
+                excluded from authentication
+        """
+        user = self.user_for_request(request)
+        if not self.require_auth(request.path, excluded_paths):
+            return
+        if (self.authorization_header(request) is None
+                and self.session_cookie(request) is None):
+            abort(401, description="Unauthorized")
+        if user is None:
+            abort(403, description='Forbidden')
+
     def session_cookie(self, request=None):
         """Get the session cookie from the request
 
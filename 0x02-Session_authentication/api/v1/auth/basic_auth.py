@@ -4,9 +4,15 @@ Basic authentication Module
 """
 
 
+from collections import OrderedDict
+from hashlib import sha256
 from typing import TypeVar
 from api.v1.auth.auth import Auth
 import base64
+import hmac
+import os
+import threading
+import time
 
 from models.user import User
 
@@ -14,7 +20,24 @@ from models.user import User
 class BasicAuth(Auth):
     """
     Class for Basic authentication
+
+    Verified credentials are cached: a keyed hash of the Authorization
+    header maps to the ID and password hash of its user, for at most
+    CREDENTIALS_TTL seconds and CREDENTIALS_CACHE_SIZE headers (least
+    recently used first out). An entry is dropped as soon as its user
+    is removed or its password changes.
     """
+    CREDENTIALS_TTL = 300
+    CREDENTIALS_CACHE_SIZE = 1024
+
+    def __init__(self):
+        """
+        Initialize the verified-credential cache
+        """
+        super().__init__()
+        self._credentials_key = os.urandom(32)
+        self._credentials = OrderedDict()
+        self._credentials_lock = threading.Lock()
 
     def extract_base64_authorization_header(self, auth_header: str) -> str:
         """
@@ -117,12 +140,63 @@ class BasicAuth(Auth):
         """
         auth_header = self.authorization_header(request)
         if auth_header is not None:
+            key = hmac.new(self._credentials_key,
+                           auth_header.encode("utf-8"), sha256).digest()
+            user = self._cached_user(key)
+            if user is not None:
+                return user
             token = self.extract_base64_authorization_header(auth_header)
             if token is not None:
                 decoded = self.decode_base64_authorization_header(token)
                 if decoded is not None:
                     email, password = self.extract_user_credentials(decoded)
                     if email is not None:
-                        return self.user_object_from_credentials(email, password)
+                        user = self.user_object_from_credentials(email, password)
+                        if user is not None:
+                            self._cache_user(key, user)
+                        return user
 
         return None
+
+    def _cached_user(self, key: bytes) -> TypeVar("User"):
+        """
+        Retrieves the user of a cached Authorization header
+
+        Args:
+            key (bytes): The keyed hash of the header
+
+        Returns:
+            User: The user if the header is cached, unexpired, and its user
+            still exists with the same password, None otherwise
+        """
+        with self._credentials_lock:
+            entry = self._credentials.get(key)
+            if entry is None:
+                return None
+            user_id, password, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._credentials[key]
+                return None
+            self._credentials.move_to_end(key)
+
+        user = User.get(user_id)
+        if user is None or user.password != password:
+            with self._credentials_lock:
+                self._credentials.pop(key, None)
+            return None
+        return user
+
+    def _cache_user(self, key: bytes, user: TypeVar("User")):
+        """
+        Caches the user of a verified Authorization header
+
+        Args:
+            key (bytes): The keyed hash of the header
+            user (User): The user the header was verified against
+        """
+        expires_at = time.monotonic() + self.CREDENTIALS_TTL
+        with self._credentials_lock:
+            self._credentials[key] = (user.id, user.password, expires_at)
+            self._credentials.move_to_end(key)
+            while len(self._credentials) > self.CREDENTIALS_CACHE_SIZE:
+                self._credentials.popitem(last=False)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Excluded-path matcher module
+"""
+
+
+from functools import lru_cache
+from typing import Iterable
+
+
+class PathMatcher:
+    """Prefix trie of the paths excluded from authentication
+
+    Patterns are compiled once, then each path is matched in a single
+    walk over its characters. Matching rules:
+        - "/api/v1/status/" matches "/api/v1/status", "/api/v1/status/"
+          and any path under it, such as "/api/v1/status/db"
+        - a trailing "*" matches any continuation: "/api/v1/stat*"
+          matches "/api/v1/stats" and "/api/v1/status"
+    Results are cached per distinct path in a bounded LRU.
+    """
+
+    CACHE_SIZE = 1024
+
+    def __init__(self, patterns: Iterable[str]):
+        """Compile the patterns into a trie
+
+        Args:
+            patterns (Iterable[str]): The excluded paths
+        """
+        self.patterns = tuple(patterns)
+        self.trie = {}
+        for pattern in self.patterns:
+            if not pattern:
+                continue
+            if pattern.endswith("*"):
+                pattern = pattern[:-1]
+            elif not pattern.endswith("/"):
+                pattern += "/"
+            node = self.trie
+            for char in pattern:
+                node = node.setdefault(char, {})
+            node[None] = True
+        self.matches = lru_cache(maxsize=self.CACHE_SIZE)(self._match)
+
+    def __bool__(self) -> bool:
+        """Tell whether at least one pattern was compiled"""
+        return bool(self.trie)
+
+    def _match(self, path: str) -> bool:
+        """Check if a path is excluded
+
+        Args:
+            path (str): The path to check
+
+        Returns:
+            bool: True if the path matches one of the patterns
+        """
+        if not path.endswith("/"):
+            path += "/"
+        node = self.trie
+        for char in path:
+            if None in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return None in node
@@ -5,13 +5,22 @@ Session-based authentication module
 
 
 from .auth import Auth
+from .session_store import session_store_from_env
 from models.user import User
 from uuid import uuid4
 
 
 class SessionAuth(Auth):
-    """Class for session-based authentication"""
-    user_id_by_session_id = {}
+    """Class for session-based authentication
+
+    Sessions are kept in the SessionStore configured by the environment
+    (see session_store_from_env), which expires and evicts them.
+    """
+
+    def __init__(self):
+        """Initialize the session store"""
+        super().__init__()
+        self.user_id_by_session_id = session_store_from_env()
 
     def create_session(self, user_id: str = None) -> str:
         """Create a session for the given user ID
@@ -56,6 +65,19 @@ class SessionAuth(Auth):
         user = User.get(user_id)
         return user
 
+    def destroy_all_sessions(self, user_id: str = None) -> int:
+        """Destroy all the sessions of a user
+
+        Args:
+            user_id (str, optional): User ID. Defaults to None.
+
+        Returns:
+            int: The number of sessions destroyed
+        """
+        if user_id is None or not isinstance(user_id, str):
+            return 0
+        return self.user_id_by_session_id.delete_user_sessions(user_id)
+
     def destroy_session(self, request=None):
         """Destroy the session associated with the session ID in the request
 
@@ -73,5 +95,5 @@ class SessionAuth(Auth):
         user_id = self.user_id_for_session_id(session_cookie)
         if user_id is None:
             return False
-        del self.user_id_by_session_id[session_cookie]
+        self.user_id_by_session_id.pop(session_cookie, None)
         return True
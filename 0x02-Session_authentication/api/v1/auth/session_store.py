@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+Session store module
+"""
+
+
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from heapq import heapify, heappop, heappush
+from os import fsync, getenv, getpid, path, replace
+import json
+import sqlite3
+import threading
+import time
+
+
+class SessionStore(MutableMapping):
+    """Mapping of session IDs to user IDs
+
+    Implementations provide the MutableMapping methods. Reading a
+    session counts as activity for the idle timeout. Sessions that
+    expired or were evicted are missing, as if they had never been
+    created.
+    """
+
+    def delete_user_sessions(self, user_id: str) -> int:
+        """Delete all the sessions of a user
+
+        This scans the whole store: implementations override it with a
+        lookup in an index of the sessions by user.
+
+        Args:
+            user_id (str): The user ID.
+
+        Returns:
+            int: The number of sessions deleted.
+        """
+        session_ids = [session_id for session_id in self
+                       if self.get(session_id) == user_id]
+        for session_id in session_ids:
+            self.pop(session_id, None)
+        return len(session_ids)
+
+
+class MemorySessionStore(SessionStore):
+    """Session store held in process memory
+
+    Sessions expire ttl seconds after their creation, or idle_timeout
+    seconds after they were last read, whichever comes first (0 disables
+    either limit). Past max_size sessions, the least recently used one
+    is evicted. The session IDs of each user are indexed, so all of them
+    are deleted in time proportional to their number.
+
+    Expiry deadlines are kept in a min-heap. Every access pops the
+    deadlines that are due, so each session costs O(log n) once instead
+    of a scan of the whole store. A popped session that was read in the
+    meantime is pushed back with its new deadline. The deadlines of
+    sessions that were deleted, evicted or replaced stay in the heap
+    until it holds DEADLINES_SLACK times as many entries as there are
+    sessions (plus DEADLINES_MIN), when it is rebuilt from the sessions.
+    """
+    DEADLINES_SLACK = 2
+    DEADLINES_MIN = 64
+
+    def __init__(self, ttl: int = 0, idle_timeout: int = 0,
+                 max_size: int = 0):
+        """Initialize an empty store
+
+        Args:
+            ttl (int): Lifetime of a session, in seconds.
+            idle_timeout (int): Maximum time between two reads of a
+                session, in seconds.
+            max_size (int): Maximum number of sessions.
+        """
+        self.ttl = ttl
+        self.idle_timeout = idle_timeout
+        self.max_size = max_size
+        # session ID -> [user ID, created at, last seen], in LRU order
+        self._sessions = OrderedDict()
+        # user ID -> session IDs
+        self._sessions_by_user = {}
+        self._deadlines = []
+        self._lock = threading.RLock()
+
+    def _deadline(self, entry: list) -> float:
+        """Compute the expiry time of a session
+
+        Args:
+            entry (list): The user ID, creation and last read times.
+
+        Returns:
+            float: The expiry time, or None if the session never expires.
+        """
+        deadlines = []
+        if self.ttl:
+            deadlines.append(entry[1] + self.ttl)
+        if self.idle_timeout:
+            deadlines.append(entry[2] + self.idle_timeout)
+        return min(deadlines) if deadlines else None
+
+    def _expire(self, now: float):
+        """Drop the sessions whose deadline has passed
+
+        Args:
+            now (float): The current time.
+        """
+        while self._deadlines and self._deadlines[0][0] <= now:
+            session_id = heappop(self._deadlines)[1]
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                continue
+            deadline = self._deadline(entry)
+            if deadline <= now:
+                self._drop(session_id)
+            else:
+                heappush(self._deadlines, (deadline, session_id))
+
+    def _add(self, session_id: str, entry: list):
+        """Store a session, evicting the least recently used ones
+
+        Args:
+            session_id (str): The session ID.
+            entry (list): The user ID, creation and last read times.
+        """
+        previous = self._sessions.get(session_id)
+        if previous is not None:
+            self._unindex(session_id, previous[0])
+        self._sessions[session_id] = entry
+        self._sessions.move_to_end(session_id)
+        self._sessions_by_user.setdefault(entry[0], set()).add(session_id)
+        deadline = self._deadline(entry)
+        if deadline is not None:
+            heappush(self._deadlines, (deadline, session_id))
+        while self.max_size and len(self._sessions) > self.max_size:
+            self._drop(next(iter(self._sessions)))
+        self._compact_deadlines()
+
+    def _compact_deadlines(self):
+        """Rebuild the deadline heap from the sessions, once most of its
+        entries are stale"""
+        if (len(self._deadlines) <= self.DEADLINES_MIN
+                + self.DEADLINES_SLACK * len(self._sessions)):
+            return
+        deadlines = []
+        for session_id, entry in self._sessions.items():
+            deadline = self._deadline(entry)
+            if deadline is not None:
+                deadlines.append((deadline, session_id))
+        heapify(deadlines)
+        self._deadlines = deadlines
+
+    def _drop(self, session_id: str):
+        """Remove a session (expired, evicted or deleted)
+
+        Args:
+            session_id (str): The session ID.
+        """
+        entry = self._sessions.pop(session_id)
+        self._unindex(session_id, entry[0])
+        self._compact_deadlines()
+
+    def _unindex(self, session_id: str, user_id: str):
+        """Remove a session ID from the sessions of its user
+
+        Args:
+            session_id (str): The session ID.
+            user_id (str): The user ID.
+        """
+        session_ids = self._sessions_by_user.get(user_id)
+        if session_ids is not None:
+            session_ids.discard(session_id)
+            if not session_ids:
+                del self._sessions_by_user[user_id]
+
+    def delete_user_sessions(self, user_id: str) -> int:
+        """Delete all the sessions of a user
+
+        Args:
+            user_id (str): The user ID.
+
+        Returns:
+            int: The number of sessions deleted.
+        """
+        with self._lock:
+            session_ids = list(self._sessions_by_user.get(user_id, ()))
+            for session_id in session_ids:
+                self._drop(session_id)
+            return len(session_ids)
+
+    def __getitem__(self, session_id: str) -> str:
+        """Return the user ID of a live session, and mark it as used"""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                raise KeyError(session_id)
+            deadline = self._deadline(entry)
+            if deadline is not None and deadline <= now:
+                self._drop(session_id)
+                raise KeyError(session_id)
+            entry[2] = now
+            self._sessions.move_to_end(session_id)
+            return entry[0]
+
+    def __setitem__(self, session_id: str, user_id: str):
+        """Create (or replace) a session"""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            self._add(session_id, [user_id, now, now])
+
+    def __delitem__(self, session_id: str):
+        """Delete a session"""
+        with self._lock:
+            if session_id not in self._sessions:
+                raise KeyError(session_id)
+            self._drop(session_id)
+
+    def __iter__(self):
+        """Iterate over the IDs of the live sessions"""
+        with self._lock:
+            self._expire(time.time())
+            return iter(list(self._sessions))
+
+    def __len__(self) -> int:
+        """Return the number of live sessions"""
+        with self._lock:
+            self._expire(time.time())
+            return len(self._sessions)
+
+
+class FileSessionStore(MemorySessionStore):
+    """Memory session store backed by an append-only journal file
+
+    Every creation and removal of a session is appended to the journal,
+    which is replayed at startup so sessions survive restarts. Reads are
+    not journaled: after a restart, the idle timeout of each session
+    starts over, while its lifetime still counts from its creation. Once
+    the journal holds COMPACT_EVERY records and twice as many as there
+    are sessions, it is rewritten with the live sessions only.
+    """
+    COMPACT_EVERY = 1000
+
+    def __init__(self, file_path: str, ttl: int = 0, idle_timeout: int = 0,
+                 max_size: int = 0):
+        """Load the sessions of the journal
+
+        Args:
+            file_path (str): Path of the journal.
+            ttl (int): Lifetime of a session, in seconds.
+            idle_timeout (int): Maximum time between two reads of a
+                session, in seconds.
+            max_size (int): Maximum number of sessions.
+        """
+        super().__init__(ttl, idle_timeout, max_size)
+        self.file_path = file_path
+        self._records = 0
+        self._replaying = True
+        self._replay()
+        self._replaying = False
+        if self._records > len(self._sessions):
+            self._compact()
+
+    def _replay(self):
+        """Rebuild the sessions from the journal"""
+        if not path.exists(self.file_path):
+            return
+        now = time.time()
+        with open(self.file_path, 'r') as f:
+            for line in f:
+                # A torn line (interrupted write) is counted as a record,
+                # so the journal is compacted before the next append
+                self._records += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                session_id = record["id"]
+                if record["op"] == "set":
+                    self._add(session_id,
+                              [record["user_id"], record["created_at"], now])
+                elif session_id in self._sessions:
+                    self._drop(session_id)
+        self._expire(now)
+
+    def _append(self, record: dict):
+        """Append a record to the journal, compacting it if needed
+
+        Args:
+            record (dict): The record ("op", "id" and, for a creation,
+                "user_id" and "created_at").
+        """
+        if self._replaying:
+            return
+        with open(self.file_path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+        self._records += 1
+        if (self._records >= self.COMPACT_EVERY
+                and self._records >= 2 * len(self._sessions)):
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the journal with the live sessions only"""
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            for session_id, entry in self._sessions.items():
+                f.write(json.dumps({"op": "set", "id": session_id,
+                                    "user_id": entry[0],
+                                    "created_at": entry[1]}) + "\n")
+            f.flush()
+            fsync(f.fileno())
+        replace(tmp_path, self.file_path)
+        self._records = len(self._sessions)
+
+    def _add(self, session_id: str, entry: list):
+        """Store and journal a session"""
+        super()._add(session_id, entry)
+        if session_id in self._sessions:
+            self._append({"op": "set", "id": session_id,
+                          "user_id": entry[0], "created_at": entry[1]})
+
+    def _drop(self, session_id: str):
+        """Remove and journal the removal of a session"""
+        super()._drop(session_id)
+        self._append({"op": "delete", "id": session_id})
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store in a SQLite database, shared by processes
+
+    The database runs in WAL mode, so lookups from any number of worker
+    processes read concurrently and never wait on a writer. Each thread
+    of each process opens its own connection (reopened after a fork).
+
+    Same expiry rules as MemorySessionStore, with two relaxations to
+    keep lookups read-only most of the time: the last read time of a
+    session is written at most once every TOUCH_INTERVAL seconds (never
+    without an idle timeout or a max_size, which are what it is for), and
+    expired sessions and the sessions past max_size (least recently
+    used first) are purged once every PURGE_EVERY creations.
+    """
+    TOUCH_INTERVAL = 1
+    PURGE_EVERY = 100
+
+    def __init__(self, file_path: str, ttl: int = 0, idle_timeout: int = 0,
+                 max_size: int = 0):
+        """Create the sessions table if needed
+
+        Args:
+            file_path (str): Path of the database.
+            ttl (int): Lifetime of a session, in seconds.
+            idle_timeout (int): Maximum time between two reads of a
+                session, in seconds.
+            max_size (int): Maximum number of sessions.
+        """
+        self.file_path = file_path
+        self.ttl = ttl
+        self.idle_timeout = idle_timeout
+        self.max_size = max_size
+        self._local = threading.local()
+        self._creations = 0
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS sessions ("
+                   "session_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, "
+                   "created_at REAL NOT NULL, last_seen REAL NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS sessions_created_at "
+                   "ON sessions (created_at)")
+        db.execute("CREATE INDEX IF NOT EXISTS sessions_last_seen "
+                   "ON sessions (last_seen)")
+        db.execute("CREATE INDEX IF NOT EXISTS sessions_user_id "
+                   "ON sessions (user_id)")
+
+    def _db(self) -> sqlite3.Connection:
+        """Return the connection of the current thread and process
+
+        Returns:
+            sqlite3.Connection: The connection, in autocommit mode.
+        """
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != getpid():
+            db = sqlite3.connect(self.file_path, timeout=5,
+                                 isolation_level=None,
+                                 check_same_thread=False)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = getpid()
+        return db
+
+    def _cutoffs(self, now: float) -> tuple:
+        """Compute the creation and last read times of expired sessions
+
+        Args:
+            now (float): The current time.
+
+        Returns:
+            tuple: Sessions created or last read at or before these
+            times are expired (-1 when the limit is disabled).
+        """
+        created = now - self.ttl if self.ttl else -1
+        last_seen = now - self.idle_timeout if self.idle_timeout else -1
+        return created, last_seen
+
+    def _purge(self, now: float):
+        """Delete the expired sessions, then the least recently used ones
+        past max_size
+
+        Args:
+            now (float): The current time.
+        """
+        db = self._db()
+        db.execute("DELETE FROM sessions "
+                   "WHERE created_at <= ? OR last_seen <= ?",
+                   self._cutoffs(now))
+        if self.max_size:
+            db.execute("DELETE FROM sessions WHERE session_id IN ("
+                       "SELECT session_id FROM sessions "
+                       "ORDER BY last_seen DESC LIMIT -1 OFFSET ?)",
+                       (self.max_size,))
+
+    def __getitem__(self, session_id: str) -> str:
+        """Return the user ID of a live session, and mark it as used"""
+        now = time.time()
+        db = self._db()
+        row = db.execute("SELECT user_id, created_at, last_seen "
+                         "FROM sessions WHERE session_id = ?",
+                         (session_id,)).fetchone()
+        if row is None:
+            raise KeyError(session_id)
+        user_id, created_at, last_seen = row
+        created, seen = self._cutoffs(now)
+        if created_at <= created or last_seen <= seen:
+            db.execute("DELETE FROM sessions WHERE session_id = ?",
+                       (session_id,))
+            raise KeyError(session_id)
+        if ((self.idle_timeout or self.max_size)
+                and now - last_seen >= self.TOUCH_INTERVAL):
+            db.execute("UPDATE sessions SET last_seen = ? "
+                       "WHERE session_id = ?", (now, session_id))
+        return user_id
+
+    def __setitem__(self, session_id: str, user_id: str):
+        """Create (or replace) a session"""
+        now = time.time()
+        self._db().execute("INSERT OR REPLACE INTO sessions "
+                           "VALUES (?, ?, ?, ?)",
+                           (session_id, user_id, now, now))
+        self._creations += 1
+        if self._creations % self.PURGE_EVERY == 0:
+            self._purge(now)
+
+    def __delitem__(self, session_id: str):
+        """Delete a session"""
+        cursor = self._db().execute("DELETE FROM sessions "
+                                    "WHERE session_id = ?", (session_id,))
+        if cursor.rowcount == 0:
+            raise KeyError(session_id)
+
+    def delete_user_sessions(self, user_id: str) -> int:
+        """Delete all the sessions of a user
+
+        Args:
+            user_id (str): The user ID.
+
+        Returns:
+            int: The number of sessions deleted.
+        """
+        return self._db().execute("DELETE FROM sessions WHERE user_id = ?",
+                                  (user_id,)).rowcount
+
+    def __iter__(self):
+        """Iterate over the IDs of the live sessions"""
+        rows = self._db().execute("SELECT session_id FROM sessions "
+                                  "WHERE created_at > ? AND last_seen > ?",
+                                  self._cutoffs(time.time())).fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self) -> int:
+        """Return the number of live sessions"""
+        return self._db().execute("SELECT COUNT(*) FROM sessions "
+                                  "WHERE created_at > ? AND last_seen > ?",
+                                  self._cutoffs(time.time())).fetchone()[0]
+
+
+def session_store_from_env() -> SessionStore:
+    """Build the session store configured by the environment
+
+    Variables:
+        - SESSION_STORE: "memory" (default), "file" or "sqlite" (to
+          share sessions between worker processes)
+        - SESSION_STORE_PATH: journal of the file store (default:
+          .db_sessions.journal) or database of the sqlite store
+          (default: .db_sessions.sqlite)
+        - SESSION_DURATION: lifetime of a session, in seconds
+          (default: 0, no limit)
+        - SESSION_IDLE_TIMEOUT: maximum time between two requests of a
+          session, in seconds (default: 0, no limit)
+        - SESSION_MAX_SIZE: maximum number of sessions (default: 100000)
+
+    Returns:
+        SessionStore: The session store.
+    """
+    def _int(name: str, default: int) -> int:
+        try:
+            return max(int(getenv(name, default)), 0)
+        except ValueError:
+            return default
+
+    ttl = _int('SESSION_DURATION', 0)
+    idle_timeout = _int('SESSION_IDLE_TIMEOUT', 0)
+    max_size = _int('SESSION_MAX_SIZE', 100000)
+    store = getenv('SESSION_STORE')
+    if store == 'file':
+        file_path = getenv('SESSION_STORE_PATH', '.db_sessions.journal')
+        return FileSessionStore(file_path, ttl, idle_timeout, max_size)
+    if store == 'sqlite':
+        file_path = getenv('SESSION_STORE_PATH', '.db_sessions.sqlite')
+        return SQLiteSessionStore(file_path, ttl, idle_timeout, max_size)
+    return MemorySessionStore(ttl, idle_timeout, max_size)
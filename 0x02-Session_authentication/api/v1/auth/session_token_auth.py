@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Signed session token authentication module
+"""
+
+
+from .auth import Auth
+from .session_auth import SessionAuth
+from .session_store import FileSessionStore, SessionStore, SQLiteSessionStore
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from hashlib import sha256
+from heapq import heappop, heappush
+import hmac
+import os
+import threading
+import time
+
+
+class DenyList:
+    """Revoked session tokens, until they expire
+
+    Only the first DIGEST_SIZE bytes of the signature of a token are
+    kept, and each one is dropped once its token has expired (deadlines
+    are kept in a min-heap), so the list never holds more than the
+    revoked tokens that are still valid. All the tokens of a user are
+    revoked at once by recording the time of revocation for the user,
+    until the last token issued before it has expired.
+
+    The list is held in process memory, or in a SessionStore (whose
+    sessions must outlive the tokens) that keeps it across restarts and,
+    for a SQLiteSessionStore, shares it between worker processes.
+    """
+    DIGEST_SIZE = 16
+
+    def __init__(self, store: SessionStore = None):
+        """Initialize an empty deny-list
+
+        Args:
+            store (SessionStore, optional): The store of the revocations.
+                Defaults to None, process memory.
+        """
+        self.store = store
+        self._revoked = {}
+        self._revoked_users = {}
+        self._deadlines = []
+        self._lock = threading.Lock()
+
+    def _expire(self, now: int):
+        """Forget the tokens that have expired
+
+        Args:
+            now (int): The current time.
+        """
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, _, key = heappop(self._deadlines)
+            if isinstance(key, bytes):
+                self._revoked.pop(key, None)
+                continue
+            # A user revoked again since has a later deadline
+            revoked = self._revoked_users.get(key)
+            if revoked is not None and revoked[1] <= deadline:
+                del self._revoked_users[key]
+
+    def add(self, signature: bytes, expires_at: int):
+        """Revoke a token
+
+        Args:
+            signature (bytes): The signature of the token.
+            expires_at (int): The expiry time of the token.
+        """
+        digest = signature[:self.DIGEST_SIZE]
+        if self.store is not None:
+            self.store["token:" + digest.hex()] = str(expires_at)
+            return
+        with self._lock:
+            self._expire(int(time.time()))
+            if digest not in self._revoked:
+                self._revoked[digest] = expires_at
+                heappush(self._deadlines, (expires_at, 0, digest))
+
+    def add_user(self, user_id: str, revoked_at: int, expires_at: int):
+        """Revoke all the tokens of a user issued up to a time
+
+        Args:
+            user_id (str): The user ID.
+            revoked_at (int): The tokens issued before this time, in
+                milliseconds, are revoked.
+            expires_at (int): The time at which they have all expired.
+        """
+        if self.store is not None:
+            self.store["user:" + user_id] = str(revoked_at)
+            return
+        with self._lock:
+            self._expire(int(time.time()))
+            self._revoked_users[user_id] = (revoked_at, expires_at)
+            heappush(self._deadlines, (expires_at, 1, user_id))
+
+    def revoked_at(self, user_id: str) -> int:
+        """Return the time up to which the tokens of a user are revoked
+
+        Args:
+            user_id (str): The user ID.
+
+        Returns:
+            int: The time, in milliseconds, or None if they are not.
+        """
+        if self.store is not None:
+            revoked_at = self.store.get("user:" + user_id)
+            return None if revoked_at is None else int(revoked_at)
+        revoked = self._revoked_users.get(user_id)
+        return None if revoked is None else revoked[0]
+
+    def __contains__(self, signature: bytes) -> bool:
+        """Check if a token is revoked
+
+        Args:
+            signature (bytes): The signature of the token.
+        """
+        digest = signature[:self.DIGEST_SIZE]
+        if self.store is not None:
+            return "token:" + digest.hex() in self.store
+        return digest in self._revoked
+
+    def __len__(self) -> int:
+        """Return the number of revoked tokens and users"""
+        if self.store is not None:
+            return len(self.store)
+        with self._lock:
+            self._expire(int(time.time()))
+            return len(self._revoked) + len(self._revoked_users)
+
+
+class SessionTokenAuth(SessionAuth):
+    """Session authentication with stateless signed tokens
+
+    The session cookie is "<user ID>.<expiry>.<issue time>.<nonce>.
+    <signature>", the issue time being in milliseconds and the signature
+    an HMAC-SHA256 of the rest with the signing key (see signing_key).
+    Any process that shares the key validates a token on its own,
+    without a session store. Tokens expire after SESSION_DURATION
+    seconds (one day by default); logging out adds the token to a
+    deny-list until it expires.
+
+    Destroying all the sessions of a user rejects the tokens issued
+    before it, to the millisecond: a login just after it still works.
+
+    The deny-list is best-effort by default: it lives in process
+    memory, so a revoked token is still accepted by the other processes
+    and after a restart, until it expires. SESSION_STORE makes it
+    reliable at the cost of a shared lookup per validation (see
+    revocation_store): with "sqlite" it is shared between the worker
+    processes of a host, with "file" it survives restarts.
+    """
+    DEFAULT_DURATION = 86400
+
+    def __init__(self):
+        """Initialize the signing key, the duration and the deny-list"""
+        Auth.__init__(self)
+        self.secret = self.signing_key()
+        try:
+            self.session_duration = int(os.getenv('SESSION_DURATION', 0))
+        except ValueError:
+            self.session_duration = 0
+        if self.session_duration <= 0:
+            self.session_duration = self.DEFAULT_DURATION
+        self.deny_list = DenyList(self.revocation_store())
+
+    @staticmethod
+    def signing_key() -> bytes:
+        """Return the key that signs the tokens
+
+        It is SESSION_SECRET, which every host must share. Without it, a
+        random key is generated once in the file SESSION_SECRET_PATH
+        (default: .session_secret) and read by the other processes, so
+        that the workers of a single host accept each other's tokens.
+
+        Returns:
+            bytes: The key
+        """
+        secret = os.getenv('SESSION_SECRET')
+        if secret:
+            return secret.encode("utf-8")
+        file_path = os.getenv('SESSION_SECRET_PATH', '.session_secret')
+        if not os.path.exists(file_path):
+            # Linking a complete file: the first process to do it wins
+            temp_path = "{}.{}".format(file_path, os.urandom(8).hex())
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                         0o600)
+            with os.fdopen(fd, "wb") as key_file:
+                key_file.write(os.urandom(32))
+            try:
+                os.link(temp_path, file_path)
+            except FileExistsError:
+                pass
+            finally:
+                os.unlink(temp_path)
+        with open(file_path, "rb") as key_file:
+            return key_file.read()
+
+    def revocation_store(self) -> SessionStore:
+        """Build the store of the revoked tokens set by SESSION_STORE
+
+        Its entries live as long as the tokens (SESSION_DURATION), and
+        are never evicted early.
+
+        Returns:
+            SessionStore: The store, or None to keep the revocations in
+            process memory (best-effort)
+        """
+        store = os.getenv('SESSION_STORE')
+        if store == 'sqlite':
+            file_path = os.getenv('SESSION_STORE_PATH', '.db_sessions.sqlite')
+            return SQLiteSessionStore(file_path, self.session_duration)
+        if store == 'file':
+            file_path = os.getenv('SESSION_STORE_PATH',
+                                  '.db_sessions.journal')
+            return FileSessionStore(file_path, self.session_duration)
+        return None
+
+    def _sign(self, payload: str) -> bytes:
+        """Sign a token payload
+
+        Args:
+            payload (str): The user ID, expiry, issue time and nonce of
+                the token.
+
+        Returns:
+            bytes: The signature
+        """
+        return hmac.new(self.secret, payload.encode("utf-8"), sha256).digest()
+
+    def _verify(self, session_id: str) -> tuple:
+        """Check the signature and expiry of a token
+
+        Args:
+            session_id (str): The token.
+
+        Returns:
+            tuple: The user ID, expiry, issue time and signature of the
+            token, or None if the token is invalid or expired.
+        """
+        if session_id is None or not isinstance(session_id, str):
+            return None
+        try:
+            payload, signature = session_id.rsplit(".", 1)
+            user_id, expires_at, issued_at, _ = payload.split(".")
+            expires_at = int(expires_at)
+            issued_at = int(issued_at)
+            signature = urlsafe_b64decode(signature + "==")
+        except ValueError:
+            return None
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        if expires_at <= time.time():
+            return None
+        return user_id, expires_at, issued_at, signature
+
+    def create_session(self, user_id: str = None) -> str:
+        """Create a signed session token for the given user ID
+
+        Args:
+            user_id (str, optional): User ID. Defaults to None.
+
+        Returns:
+            str: Session token
+        """
+        if user_id is None or not isinstance(user_id, str):
+            return None
+
+        now = time.time()
+        expires_at = int(now) + self.session_duration
+        nonce = os.urandom(8).hex()
+        payload = "{}.{}.{}.{}".format(user_id, expires_at, int(now * 1000),
+                                       nonce)
+        signature = urlsafe_b64encode(self._sign(payload)).rstrip(b"=")
+        return "{}.{}".format(payload, signature.decode("ascii"))
+
+    def user_id_for_session_id(self, session_id: str = None) -> str:
+        """Get the user ID carried by a valid, unrevoked session token
+
+        Args:
+            session_id (str, optional): Session token. Defaults to None.
+
+        Returns:
+            str: User ID
+        """
+        token = self._verify(session_id)
+        if token is None or self._revoked(token):
+            return None
+        return token[0]
+
+    def _revoked(self, token: tuple) -> bool:
+        """Check if a token is in the deny-list
+
+        Args:
+            token (tuple): The user ID, expiry, issue time and signature of
+                the token.
+
+        Returns:
+            bool: True if the token or all the tokens of its user are
+            revoked
+        """
+        user_id, _, issued_at, signature = token
+        if signature in self.deny_list:
+            return True
+        revoked_at = self.deny_list.revoked_at(user_id)
+        return revoked_at is not None and issued_at < revoked_at
+
+    def destroy_all_sessions(self, user_id: str = None) -> int:
+        """Revoke all the session tokens of a user
+
+        Tokens are not stored, so they cannot be counted.
+
+        Args:
+            user_id (str, optional): User ID. Defaults to None.
+
+        Returns:
+            int: 0
+        """
+        if user_id is None or not isinstance(user_id, str):
+            return 0
+        now = time.time()
+        self.deny_list.add_user(user_id, int(now * 1000),
+                                int(now) + self.session_duration)
+        return 0
+
+    def destroy_session(self, request=None):
+        """Revoke the session token of the request
+
+        Args:
+            request (object, optional): Request object. Defaults to None.
+
+        Returns:
+            bool: True if the token is revoked, False otherwise
+        """
+        if request is None:
+            return False
+        token = self._verify(self.session_cookie(request))
+        if token is None or self._revoked(token):
+            return False
+        self.deny_list.add(token[3], token[1])
+        return True
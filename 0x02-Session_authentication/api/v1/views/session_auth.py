@@ -42,3 +42,20 @@ def logout():
     if auth.destroy_session(request):
         return jsonify({}), 200
     abort(404)
+
+
+@app_views.route('/users/<user_id>/sessions', methods=['DELETE'],
+                 strict_slashes=False)
+def logout_everywhere(user_id: str = None):
+    """
+    Destroy all the sessions of the current user ("me" or their ID)
+    """
+    from api.v1.app import auth
+    if not hasattr(auth, 'destroy_all_sessions'):
+        abort(404)
+    user = request.current_user
+    if user is None:
+        abort(404)
+    if user_id not in ("me", user.id):
+        abort(403)
+    return jsonify({"sessions": auth.destroy_all_sessions(user.id)}), 200
@@ -2,16 +2,105 @@
 """
 User resource module
 """
+import json
+from urllib.parse import urlencode
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request
 from models.user import User
 
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
-    """Returns a list of all User objects in JSON format."""
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    """Returns a list of User objects in JSON format.
+
+    Query parameters (all optional):
+        - limit: maximum number of users (at most MAX_PAGE_SIZE), ordered
+          by ID; a Link header gives the URL of the next page
+        - after: ID of the last user of the previous page
+        - fields: comma-separated attributes to return for each user
+        - stream: when "1" or "true", the list is serialized and sent in
+          chunks, STREAM_BATCH_SIZE users at a time
+
+    Returns:
+        str: The list of User objects in JSON format.
+
+    Raises:
+        400: If limit is not a positive integer.
+    """
+    after = request.args.get('after')
+    limit = request.args.get('limit')
+    fields = request.args.get('fields')
+    stream = request.args.get('stream', '').lower() in ('1', 'true')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return jsonify({'error': "limit must be a positive integer"}), 400
+        limit = min(limit, MAX_PAGE_SIZE)
+    if fields is not None:
+        fields = [field for field in fields.split(',') if field]
+
+    if stream:
+        return Response(_stream_users(after, limit, fields),
+                        mimetype='application/json')
+
+    if after is None and limit is None:
+        users = User.all()
+    else:
+        users = User.page(after, limit)
+    response = jsonify([_project(user.to_json(), fields) for user in users])
+    if limit is not None and len(users) == limit:
+        args = request.args.copy()
+        args['after'] = users[-1].id
+        args['limit'] = limit
+        response.headers['Link'] = '<{}?{}>; rel="next"'.format(
+            request.base_url, urlencode(list(args.items(multi=True))))
+    return response
+
+
+def _project(user_json: dict, fields: list) -> dict:
+    """Keeps only the requested fields of a serialized User.
+
+    Args:
+        user_json (dict): The User in JSON format.
+        fields (list): The fields to keep, or None to keep them all.
+
+    Returns:
+        dict: The projected User.
+    """
+    if fields is None:
+        return user_json
+    return {key: user_json[key] for key in fields if key in user_json}
+
+
+def _stream_users(after: str, limit: int, fields: list):
+    """Yields a JSON list of Users chunk by chunk, in ID order.
+
+    Args:
+        after (str): ID of the user to start after, or None.
+        limit (int): Maximum number of users, or None for all of them.
+        fields (list): The fields to keep, or None to keep them all.
+    """
+    yield '['
+    sent = 0
+    while limit is None or sent < limit:
+        size = STREAM_BATCH_SIZE
+        if limit is not None:
+            size = min(size, limit - sent)
+        users = User.page(after, size)
+        if not users:
+            break
+        chunk = ','.join(json.dumps(_project(user.to_json(), fields))
+                         for user in users)
+        yield chunk if sent == 0 else ',' + chunk
+        sent += len(users)
+        after = users[-1].id
+    yield ']'
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -59,6 +148,9 @@ def delete_user(user_id: str = None) -> str:
     if user is None:
         abort(404)
     user.remove()
+    from api.v1.app import auth
+    if hasattr(auth, 'destroy_all_sessions'):
+        auth.destroy_all_sessions(user.id)
     return jsonify({}), 200
 
 
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Cost of validating a session: SessionAuth (lookup in the in-memory or
+the shared SQLite store) against SessionTokenAuth (signature check, no
+shared state), with and without the User.get that follows in
+current_user.
+
+Usage: ./benchmark_session_tokens.py [number_of_sessions]
+"""
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+from api.v1.auth.session_auth import SessionAuth
+from api.v1.auth.session_store import SQLiteSessionStore
+from api.v1.auth.session_token_auth import SessionTokenAuth
+from models.user import User
+
+LOOKUPS = 100000
+
+
+def measure(auth: SessionAuth, session_ids: list, with_user: bool) -> float:
+    """Return the mean time (in seconds) of validating one session."""
+    sample = [random.choice(session_ids) for _ in range(LOOKUPS)]
+
+    def run():
+        for session_id in sample:
+            user_id = auth.user_id_for_session_id(session_id)
+            if with_user:
+                User.get(user_id)
+    return timeit.timeit(run, number=1) / LOOKUPS
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    os.chdir(tempfile.mkdtemp())
+    User.STORAGE_MODE = "journal"
+    User.load_from_file()
+    user_ids = []
+    for i in range(1000):
+        user = User(email="user{}@example.com".format(i))
+        user.save()
+        user_ids.append(user.id)
+
+    memory = SessionAuth()
+    sqlite = SessionAuth()
+    sqlite.user_id_by_session_id = SQLiteSessionStore("sessions.sqlite")
+    tokens = SessionTokenAuth()
+
+    print("sessions: {}".format(count))
+    for name, auth in (("SessionAuth (memory)", memory),
+                       ("SessionAuth (sqlite)", sqlite),
+                       ("SessionTokenAuth", tokens)):
+        session_ids = [auth.create_session(random.choice(user_ids))
+                       for _ in range(count)]
+        print("{}: {:.2f} us/validation, {:.2f} us with User.get".format(
+            name, measure(auth, session_ids, False) * 1e6,
+            measure(auth, session_ids, True) * 1e6))
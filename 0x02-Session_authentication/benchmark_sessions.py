@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Lookup throughput of the SQLite session store shared by 1, 2, 4...
+worker processes, each looking up random sessions for a fixed time.
+
+Usage: ./benchmark_sessions.py [number_of_sessions] [max_workers]
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+from api.v1.auth.session_store import SQLiteSessionStore
+
+DURATION = 2
+
+
+def lookups(file_path: str, session_ids: list, start: float, results):
+    """Look sessions up from start until start + DURATION."""
+    store = SQLiteSessionStore(file_path)
+    count = 0
+    time.sleep(max(start - time.time(), 0))
+    while time.time() < start + DURATION:
+        store[random.choice(session_ids)]
+        count += 1
+    results.put(count)
+
+
+def measure(file_path: str, session_ids: list, workers: int) -> int:
+    """Return the number of lookups per second of all the workers."""
+    results = multiprocessing.Queue()
+    start = time.time() + 0.5
+    processes = [multiprocessing.Process(
+        target=lookups, args=(file_path, session_ids, start, results))
+        for _ in range(workers)]
+    for process in processes:
+        process.start()
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total // DURATION
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 \
+        else os.cpu_count() or 1
+    file_path = os.path.join(tempfile.mkdtemp(), "sessions.sqlite")
+    store = SQLiteSessionStore(file_path)
+    session_ids = [str(uuid4()) for _ in range(count)]
+    db = store._db()
+    db.execute("BEGIN")
+    for session_id in session_ids:
+        store[session_id] = str(uuid4())
+    db.execute("COMMIT")
+    print("sessions: {}, cpus: {}".format(count, os.cpu_count()))
+    workers = 1
+    while workers <= max_workers:
+        rate = measure(file_path, session_ids, workers)
+        print("workers: {}: {} lookups/s ({:.1f} us/lookup/worker)".format(
+            workers, rate, workers * 1e6 / rate))
+        workers *= 2
@@ -3,15 +3,44 @@
 Base module
 """
 
-from datetime import datetime
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import MutableMapping
+from datetime import datetime, timedelta
 from typing import TypeVar, List, Iterable
-from os import path
+from os import path, remove, replace, fsync
+from contextlib import nullcontext
+import atexit
 import json
+import logging
+import threading
+import time
 import uuid
+import weakref
+
+from models.serializers import (BinarySerializer, JSONSerializer,
+                                is_binary_snapshot)
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+EPOCH = datetime(1970, 1, 1)
+SERIALIZERS = {
+    "json": JSONSerializer(TIMESTAMP_FORMAT),
+    "binary": BinarySerializer(),
+}
 DATA = {}
+INDEXES = {}
+INDEXED_VALUES = {}
+ORDERED_IDS = {}
+JOURNAL_SIZES = {}
+PENDING = {}
+FLUSHERS = {}
+LOADING = {}
+_LOCK = threading.RLock()
+_FILE_LOCK = threading.RLock()
+_UNHASHABLE = object()
+_MISSING = object()
+LOGGER = logging.getLogger(__name__)
 Base = TypeVar('Base')
 
 
@@ -19,8 +48,53 @@ class Base():
     """ 
     The Base class is the parent class for all other classes in the project.
     It provides common functionality and attributes.
+
+    Attributes:
+        INDEXED_ATTRIBUTES (tuple): Names of the attributes kept in a
+            secondary hash index, so equality searches on them do not
+            scan every object.
+        STORAGE_MODE (str): "snapshot" rewrites the whole class file on
+            every save/remove, "journal" appends one record per mutation
+            to a log that is replayed on load.
+        JOURNAL_COMPACT_EVERY (int): Number of journal records after
+            which the journal is compacted into the snapshot.
+        WRITE_BEHIND (bool): When True, save/remove only queue the
+            mutation and a background thread writes it out every
+            FLUSH_INTERVAL seconds, or as soon as FLUSH_THRESHOLD
+            mutations are pending, whichever comes first.
+        LAZY_LOAD (bool): When True, load_from_file returns right away and
+            a background thread streams the snapshot record by record.
+            Objects are kept in their serialized form (timestamps not
+            parsed) until first accessed.
+        COMPACT_STORAGE (bool): When True, the objects of the class are
+            kept in a ColumnStore (one column per attribute, packed
+            strings, integer timestamps) instead of one object each:
+            about 40% less memory, slower lookups.
+        SNAPSHOT_FORMAT (str): Format the snapshot is saved in, a key of
+            SERIALIZERS: "json" (.db_<Class>.json) or "binary"
+            (.db_<Class>.bin). The format of the file loaded is detected
+            from its content, so changing it converts on the next save.
+
+    Durability: snapshots are always written to a temporary file, synced
+    and renamed over the old one, so a crash leaves either the old or the
+    new snapshot. Without WRITE_BEHIND a mutation is on disk when save()
+    or remove() returns. With WRITE_BEHIND it is only in memory until the
+    next flush, so a crash can lose up to FLUSH_INTERVAL seconds (or
+    FLUSH_THRESHOLD mutations) of writes; pending mutations are flushed
+    at interpreter exit and by an explicit flush(). A failed background
+    flush is logged and retried, its mutations staying queued.
     """
 
+    INDEXED_ATTRIBUTES = ()
+    STORAGE_MODE = "snapshot"
+    JOURNAL_COMPACT_EVERY = 1000
+    WRITE_BEHIND = False
+    FLUSH_INTERVAL = 1.0
+    FLUSH_THRESHOLD = 100
+    LAZY_LOAD = False
+    COMPACT_STORAGE = False
+    SNAPSHOT_FORMAT = "json"
+
     def __init__(self, *args: list, **kwargs: dict):
         """ 
         Initialize a Base instance with optional arguments.
@@ -36,17 +110,16 @@ class Base():
         """
         class_name = str(self.__class__.__name__)
         if DATA.get(class_name) is None:
-            DATA[class_name] = {}
+            DATA[class_name] = self.__class__._new_store()
+            self.__class__._reset_indexes()
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(
-                kwargs.get('created_at'), TIMESTAMP_FORMAT)
+            self.created_at = _parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(
-                kwargs.get('updated_at'), TIMESTAMP_FORMAT)
+            self.updated_at = _parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
@@ -89,50 +162,373 @@ class Base():
     @classmethod
     def load_from_file(cls):
         """ 
-        Load all objects from file.
+        Load all objects from file, then replay the journal (if any)
+        on top of the snapshot.
+
+        With LAZY_LOAD, the load runs in a background thread: lookups of
+        already loaded IDs are served right away, and everything that
+        needs the whole set (count, search, misses, writes) waits for the
+        load to finish.
+        """
+        class_name = cls.__name__
+        cls._wait_loaded()
+        cls.flush()
+        JOURNAL_SIZES[class_name] = 0
+
+        if cls.LAZY_LOAD:
+            DATA[class_name] = cls._new_store(lazy=True)
+            cls._reset_indexes()
+            loaded = threading.Event()
+            LOADING[class_name] = loaded
+            threading.Thread(target=cls._stream_from_file,
+                             args=(loaded,), daemon=True).start()
+            return
+
+        DATA[class_name] = cls._new_store()
+        cls._reset_indexes()
+        file_path, serializer = cls._find_snapshot()
+        if file_path is not None:
+            with open(file_path, 'rb' if serializer.BINARY else 'r') as f:
+                for obj_id, obj_json in serializer.load(f):
+                    DATA[class_name][obj_id] = cls(**obj_json)
+        cls._replay_journal()
+        cls._reset_indexes()
+
+    @classmethod
+    def _snapshot_path(cls, serializer) -> str:
+        """
+        Return the path of the snapshot file of the class in a format.
+
+        Args:
+            serializer: One of the SERIALIZERS.
+
+        Returns:
+            str: The path, e.g. ".db_User.json".
+        """
+        return ".db_{}.{}".format(cls.__name__, serializer.EXTENSION)
+
+    @classmethod
+    def _find_snapshot(cls) -> tuple:
+        """
+        Find the snapshot file of the class, in any format.
+
+        Returns:
+            tuple: The path of the most recent snapshot and the serializer
+            matching its content, or (None, None) if there is none.
+        """
+        paths = [cls._snapshot_path(serializer)
+                 for serializer in SERIALIZERS.values()]
+        paths = [file_path for file_path in paths if path.exists(file_path)]
+        if not paths:
+            return (None, None)
+        file_path = max(paths, key=path.getmtime)
+        if is_binary_snapshot(file_path):
+            return (file_path, SERIALIZERS["binary"])
+        return (file_path, SERIALIZERS["json"])
+
+    @classmethod
+    def _new_store(cls, lazy: bool = False) -> dict:
+        """
+        Create the empty mapping of IDs to objects used in DATA.
+
+        Args:
+            lazy (bool): Whether serialized objects will be added to it.
+
+        Returns:
+            dict: A ColumnStore, a LazyObjects or a plain dict.
+        """
+        if cls.COMPACT_STORAGE:
+            return ColumnStore(cls)
+        if lazy:
+            return LazyObjects(cls)
+        return {}
+
+    @classmethod
+    def _stream_from_file(cls, loaded: threading.Event):
+        """
+        Stream the snapshot file into DATA in batches of serialized
+        objects, then replay the journal. Run by the lazy loader thread.
+
+        Args:
+            loaded (threading.Event): Set once the load is complete.
         """
         class_name = cls.__name__
-        file_path = ".db_{}.json".format(class_name)
-        DATA[class_name] = {}
-        if not path.exists(file_path):
+        file_path, serializer = cls._find_snapshot()
+        objs = DATA[class_name]
+        try:
+            if file_path is not None:
+                mode = 'rb' if serializer.BINARY else 'r'
+                with open(file_path, mode) as f:
+                    batch = []
+                    for obj_id, obj_json in serializer.load(f, stream=True):
+                        batch.append((obj_id, obj_json))
+                        if len(batch) >= 1000:
+                            cls._load_batch(objs, batch)
+                            batch = []
+                            # Let request threads take the lock
+                            time.sleep(0)
+                    cls._load_batch(objs, batch)
+            with _FILE_LOCK, _LOCK:
+                cls._replay_journal()
+                cls._reset_indexes()
+        finally:
+            loaded.set()
+
+    @classmethod
+    def _load_batch(cls, objs: dict, batch: list):
+        """
+        Add a batch of serialized objects to DATA and to the indexes.
+
+        Args:
+            objs (dict): The LazyObjects or ColumnStore of the class.
+            batch (list): (ID, serialized object) pairs.
+        """
+        with _LOCK:
+            for obj_id, obj_json in batch:
+                objs[obj_id] = obj_json
+                cls._index_put(obj_id, obj_json)
+
+    @classmethod
+    def _wait_loaded(cls) -> bool:
+        """
+        Wait for a background load of the class to finish.
+
+        Returns:
+            bool: True if a load was in progress.
+        """
+        loaded = LOADING.get(cls.__name__)
+        if loaded is None or loaded.is_set():
+            return False
+        loaded.wait()
+        return True
+
+    @classmethod
+    def _replay_journal(cls):
+        """
+        Apply the records of the journal file to DATA.
+
+        A truncated last line (interrupted append) is ignored, and the
+        journal is compacted right away so new records are not appended
+        after it.
+        """
+        class_name = cls.__name__
+        journal_path = ".db_{}.journal".format(class_name)
+        if not path.exists(journal_path):
             return
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[class_name][obj_id] = cls(**obj_json)
+        torn = False
+        with open(journal_path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    torn = True
+                    break
+                if record.get("op") == "save":
+                    DATA[class_name][record["id"]] = cls(**record["obj"])
+                else:
+                    DATA[class_name].pop(record["id"], None)
+                JOURNAL_SIZES[class_name] += 1
+                torn = not line.endswith("\n")
+        if torn:
+            cls.save_to_file()
 
     @classmethod
     def save_to_file(cls):
         """ 
-        Save all objects to file.
+        Save all objects to file, in the SNAPSHOT_FORMAT of the class.
+
+        The snapshot covers every pending mutation, so the write-behind
+        queue and the journal of the class are cleared, as well as the
+        snapshots of the class in other formats.
+        """
+        class_name = cls.__name__
+        serializer = SERIALIZERS[cls.SNAPSHOT_FORMAT]
+        file_path = cls._snapshot_path(serializer)
+        with _FILE_LOCK:
+            with _LOCK:
+                serialized = []
+                # Objects not built yet are saved in serialized form
+                for obj_id, obj in _raw_items(DATA[class_name]):
+                    if type(obj) is not dict:
+                        obj = serializer.serialize(obj)
+                    serialized.append((obj_id, obj))
+                PENDING.pop(class_name, None)
+
+            tmp_path = file_path + ".tmp"
+            with open(tmp_path, 'wb' if serializer.BINARY else 'w') as f:
+                serializer.dump(serialized, f)
+                f.flush()
+                fsync(f.fileno())
+            replace(tmp_path, file_path)
+            for other in SERIALIZERS.values():
+                other_path = cls._snapshot_path(other)
+                if other_path != file_path and path.exists(other_path):
+                    remove(other_path)
+
+            # The snapshot now holds every mutation of the journal
+            journal_path = ".db_{}.journal".format(class_name)
+            if path.exists(journal_path):
+                remove(journal_path)
+            JOURNAL_SIZES[class_name] = 0
+
+    @classmethod
+    def _append_journal(cls, records: List[dict]):
+        """
+        Append mutation records to the journal in a single write, and
+        compact the journal into the snapshot once it is long enough.
+
+        Args:
+            records (List[dict]): The mutations ("op", "id" and, for a
+                save, the serialized "obj").
+        """
+        class_name = cls.__name__
+        journal_path = ".db_{}.journal".format(class_name)
+        with _FILE_LOCK:
+            with open(journal_path, 'a') as f:
+                f.write("".join(json.dumps(r) + "\n" for r in records))
+            JOURNAL_SIZES[class_name] = \
+                JOURNAL_SIZES.get(class_name, 0) + len(records)
+            if JOURNAL_SIZES[class_name] >= cls.JOURNAL_COMPACT_EVERY:
+                cls.save_to_file()
+
+    @classmethod
+    def flush(cls):
+        """
+        Write out the mutations queued by write-behind, as one snapshot
+        or one group commit to the journal.
+        """
+        class_name = cls.__name__
+        with _FILE_LOCK:
+            with _LOCK:
+                records = PENDING.pop(class_name, None)
+            if not records:
+                return
+            try:
+                if cls.STORAGE_MODE == "journal":
+                    cls._append_journal(records)
+                else:
+                    cls.save_to_file()
+            except Exception:
+                with _LOCK:
+                    PENDING[class_name] = \
+                        records + PENDING.get(class_name, [])
+                raise
+
+    @classmethod
+    def _start_flusher(cls):
+        """
+        Start the background flusher thread of the class, if needed.
+
+        Returns:
+            threading.Event: The event that wakes the flusher up.
         """
         class_name = cls.__name__
-        file_path = ".db_{}.json".format(class_name)
-        objs_json = {}
-        for obj_id, obj in DATA[class_name].items():
-            objs_json[obj_id] = obj.to_json(True)
+        with _LOCK:
+            if class_name in FLUSHERS:
+                return FLUSHERS[class_name][1]
+            wake = threading.Event()
+            FLUSHERS[class_name] = (cls, wake)
+
+        def _flush_loop():
+            # The error of the failing flushes, logged once: their
+            # mutations stay queued for the next flush
+            failure = None
+            while True:
+                wake.wait(cls.FLUSH_INTERVAL)
+                wake.clear()
+                try:
+                    cls.flush()
+                except Exception as error:
+                    if repr(error) != failure:
+                        failure = repr(error)
+                        LOGGER.exception("Flushing %s failed, retrying",
+                                         class_name)
+                    continue
+                if failure is not None:
+                    failure = None
+                    LOGGER.warning("Flushing %s works again", class_name)
+
+        threading.Thread(target=_flush_loop, daemon=True).start()
+        return wake
+
+    @classmethod
+    def _write_lock(cls):
+        """
+        Lock held across a whole mutation when it is written out
+        synchronously, so the file sees mutations in memory order.
+        Write-behind mutations don't wait on file writes.
+        """
+        if cls.WRITE_BEHIND:
+            return nullcontext()
+        return _FILE_LOCK
+
+    def _record(self, op: str) -> dict:
+        """
+        Build the persistence record of a mutation of the current object.
+
+        Args:
+            op (str): "save" or "remove".
+
+        Returns:
+            dict: The record, with the serialized object for a journal save.
+        """
+        record = {"op": op, "id": self.id}
+        if op == "save" and self.__class__.STORAGE_MODE == "journal":
+            record["obj"] = self.to_json(True)
+        return record
+
+    @classmethod
+    def _persist(cls, record: dict):
+        """
+        Persist a mutation record, or queue it when writing behind.
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        Args:
+            record (dict): The record built by _record.
+        """
+        class_name = cls.__name__
+        if cls.WRITE_BEHIND:
+            wake = cls._start_flusher()
+            with _LOCK:
+                pending = PENDING.setdefault(class_name, [])
+                pending.append(record)
+                if len(pending) >= cls.FLUSH_THRESHOLD:
+                    wake.set()
+        elif cls.STORAGE_MODE == "journal":
+            cls._append_journal([record])
+        else:
+            cls.save_to_file()
 
     def save(self):
         """ 
         Save current object.
         """
-        class_name = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[class_name][self.id] = self
-        self.__class__.save_to_file()
+        cls = self.__class__
+        class_name = cls.__name__
+        cls._wait_loaded()
+        with cls._write_lock():
+            with _LOCK:
+                self.updated_at = datetime.utcnow()
+                DATA[class_name][self.id] = self
+                cls._index_add(self)
+                record = self._record("save")
+            cls._persist(record)
 
     def remove(self):
         """ 
         Remove object.
         """
-        class_name = self.__class__.__name__
-        if DATA[class_name].get(self.id) is not None:
-            del DATA[class_name][self.id]
-            self.__class__.save_to_file()
+        cls = self.__class__
+        class_name = cls.__name__
+        cls._wait_loaded()
+        with cls._write_lock():
+            with _LOCK:
+                if DATA[class_name].get(self.id) is None:
+                    return
+                del DATA[class_name][self.id]
+                cls._index_discard(self.id)
+                record = self._record("remove")
+            cls._persist(record)
 
     @classmethod
     def count(cls) -> int:
@@ -143,6 +539,7 @@ class Base():
             int: The number of objects.
         """
         class_name = cls.__name__
+        cls._wait_loaded()
         return len(DATA[class_name].keys())
 
     @classmethod
@@ -167,7 +564,10 @@ class Base():
             Base: The object with the specified ID, or None if not found.
         """
         class_name = cls.__name__
-        return DATA[class_name].get(id)
+        obj = DATA[class_name].get(id)
+        if obj is None and cls._wait_loaded():
+            obj = DATA[class_name].get(id)
+        return obj
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[Base]:
@@ -190,4 +590,568 @@ class Base():
                     return False
             return True
 
-        return list(filter(_search, DATA[class_name].values()))
+        cls._wait_loaded()
+        objs = DATA[class_name]
+        obj_ids = cls._index_candidates(attributes)
+        if obj_ids is None:
+            candidates = objs.values()
+        else:
+            candidates = [objs[obj_id] for obj_id in obj_ids
+                          if obj_id in objs]
+        return list(filter(_search, candidates))
+
+    @classmethod
+    def page(cls, after: str = None, limit: int = None) -> List[Base]:
+        """
+        Return the objects in ID order, starting after a cursor.
+
+        IDs are kept sorted by save/remove, so a cursor stays valid while
+        objects are added or removed around it.
+
+        Args:
+            after (str): The ID of the last object of the previous page,
+                or None to start from the beginning.
+            limit (int): The maximum number of objects, or None for all.
+
+        Returns:
+            List[Base]: The objects of the page.
+        """
+        class_name = cls.__name__
+        cls._wait_loaded()
+        with _LOCK:
+            obj_ids = ORDERED_IDS.get(class_name, SortedIDs()).sorted()
+            start = 0 if after is None else bisect_right(obj_ids, after)
+            stop = len(obj_ids) if limit is None else start + limit
+            obj_ids = obj_ids[start:stop]
+        objs = DATA[class_name]
+        return [objs[obj_id] for obj_id in obj_ids if obj_id in objs]
+
+    @classmethod
+    def _reset_indexes(cls):
+        """
+        Rebuild the secondary indexes and the ordered IDs of the class
+        from DATA.
+        """
+        class_name = cls.__name__
+        INDEXES[class_name] = {attr: {} for attr in cls.INDEXED_ATTRIBUTES}
+        INDEXED_VALUES[class_name] = {}
+        ORDERED_IDS[class_name] = SortedIDs(DATA.get(class_name, {}))
+        for obj_id, obj in _raw_items(DATA.get(class_name, {})):
+            if type(obj) is dict:
+                cls._index_put(obj_id, obj)
+            else:
+                cls._index_add(obj)
+
+    @classmethod
+    def _index_add(cls, obj: Base):
+        """
+        Index (or re-index) an object under its current attribute values,
+        and add its ID to the ordered IDs.
+
+        Args:
+            obj (Base): The object to index.
+        """
+        ORDERED_IDS.setdefault(cls.__name__, SortedIDs()).add(obj.id)
+
+        if not cls.INDEXED_ATTRIBUTES:
+            return
+        values = {attr: getattr(obj, attr, None)
+                  for attr in cls.INDEXED_ATTRIBUTES}
+        cls._index_put(obj.id, values)
+
+    @classmethod
+    def _index_put(cls, obj_id: str, values: dict):
+        """
+        Index an object ID under the given attribute values.
+
+        Args:
+            obj_id (str): The ID of the object.
+            values (dict): The attribute values of the object (extra keys,
+                as in a serialized object, are ignored).
+        """
+        class_name = cls.__name__
+        if not cls.INDEXED_ATTRIBUTES:
+            return
+        if class_name not in INDEXES:
+            cls._reset_indexes()
+        values = {attr: values.get(attr) for attr in cls.INDEXED_ATTRIBUTES}
+        previous = INDEXED_VALUES[class_name].get(obj_id)
+        if previous is not None:
+            if previous == values:
+                return
+            cls._index_discard(obj_id)
+        for attr, value in values.items():
+            bucket_key = _index_key(value)
+            INDEXES[class_name][attr].setdefault(bucket_key, {})[obj_id] = None
+        INDEXED_VALUES[class_name][obj_id] = values
+
+    @classmethod
+    def _index_discard(cls, obj_id: str):
+        """
+        Remove an object ID from the secondary indexes and the ordered IDs.
+
+        Args:
+            obj_id (str): The ID of the object to unindex.
+        """
+        class_name = cls.__name__
+        if class_name in ORDERED_IDS:
+            ORDERED_IDS[class_name].discard(obj_id)
+
+        values = INDEXED_VALUES.get(class_name, {}).pop(obj_id, None)
+        if values is None:
+            return
+        for attr, value in values.items():
+            index = INDEXES[class_name][attr]
+            bucket_key = _index_key(value)
+            bucket = index.get(bucket_key)
+            if bucket is None:
+                continue
+            bucket.pop(obj_id, None)
+            if not bucket:
+                del index[bucket_key]
+
+    @classmethod
+    def _index_candidates(cls, attributes: dict) -> List[str]:
+        """
+        Use the secondary indexes to narrow down a search.
+
+        Args:
+            attributes (dict): The attributes to search for.
+
+        Returns:
+            List[str]: The IDs of the objects that may match, or None if
+            no indexed attribute can be used and a full scan is needed.
+        """
+        indexes = INDEXES.get(cls.__name__)
+        if not indexes or not attributes:
+            return None
+        best = None
+        for k, v in attributes.items():
+            index = indexes.get(k)
+            if index is None:
+                continue
+            bucket_key = _index_key(v)
+            if bucket_key is _UNHASHABLE:
+                continue
+            bucket = list(index.get(bucket_key, {}))
+            bucket.extend(index.get(_UNHASHABLE, {}))
+            if best is None or len(bucket) < len(best):
+                best = bucket
+        return best
+
+
+class LazyObjects(dict):
+    """
+    Mapping of object IDs to objects that holds lazily loaded objects in
+    their serialized form, and builds each one on first access.
+    """
+
+    def __init__(self, cls: type):
+        """
+        Initialize an empty mapping for a model class.
+
+        Args:
+            cls (type): The model class used to build the objects.
+        """
+        super().__init__()
+        self.cls = cls
+
+    def _materialize(self, obj_id: str, obj):
+        """
+        Build (once) the object stored under an ID.
+        """
+        if type(obj) is not dict:
+            return obj
+        built = self.cls(**obj)
+        # Don't overwrite an object saved, removed or built meanwhile
+        current = dict.get(self, obj_id)
+        if current is obj:
+            dict.__setitem__(self, obj_id, built)
+            return built
+        return self._materialize(obj_id, current)
+
+    def __getitem__(self, obj_id: str) -> Base:
+        """Return the object stored under an ID."""
+        return self._materialize(obj_id, dict.__getitem__(self, obj_id))
+
+    def get(self, obj_id: str, default=None) -> Base:
+        """Return the object stored under an ID, or default."""
+        if obj_id not in self:
+            return default
+        return self[obj_id]
+
+    def pop(self, obj_id: str, *default) -> Base:
+        """Remove and return the object stored under an ID."""
+        obj = dict.pop(self, obj_id, *default)
+        if type(obj) is dict:
+            obj = self.cls(**obj)
+        return obj
+
+    def values(self) -> List[Base]:
+        """Return all the objects, built."""
+        return [self[obj_id] for obj_id in list(self)]
+
+    def items(self) -> List[tuple]:
+        """Return all the (ID, object) pairs, objects built."""
+        return [(obj_id, self[obj_id]) for obj_id in list(self)]
+
+    def raw_items(self) -> List[tuple]:
+        """Return all the (ID, object) pairs, unbuilt ones serialized."""
+        return list(dict.items(self))
+
+
+class SortedIDs:
+    """
+    Object IDs in sorted order. Additions and removals are buffered and
+    merged on the next read, so that saving N objects costs one sort
+    rather than N insertions in a list.
+    """
+
+    def __init__(self, obj_ids: Iterable[str] = ()):
+        """
+        Initialize the sorted IDs.
+
+        Args:
+            obj_ids (Iterable[str]): The initial IDs.
+        """
+        self.ids = sorted(obj_ids)
+        self.added = set()
+        self.removed = set()
+
+    def add(self, obj_id: str):
+        """Add an ID, if not there yet."""
+        self.removed.discard(obj_id)
+        if not self._merged(obj_id):
+            self.added.add(obj_id)
+
+    def discard(self, obj_id: str):
+        """Remove an ID, if there."""
+        if obj_id in self.added:
+            self.added.remove(obj_id)
+        elif self._merged(obj_id):
+            self.removed.add(obj_id)
+
+    def sorted(self) -> List[str]:
+        """Return the sorted list of the IDs (not to be modified)."""
+        if self.removed:
+            self.ids = [obj_id for obj_id in self.ids
+                        if obj_id not in self.removed]
+            self.removed.clear()
+        if self.added:
+            self.ids.extend(self.added)
+            self.ids.sort()
+            self.added.clear()
+        return self.ids
+
+    def _merged(self, obj_id: str) -> bool:
+        """Tell whether an ID is in the sorted list."""
+        position = bisect_left(self.ids, obj_id)
+        return position < len(self.ids) and self.ids[position] == obj_id
+
+
+class ColumnStore(MutableMapping):
+    """
+    Compact mapping of object IDs to objects: each attribute is kept in a
+    column (a PackedColumn, or an array of microseconds since the epoch
+    for the timestamps) instead of in a __dict__ per object.
+
+    Objects are built on access, which makes reads slower than with a
+    dict. The objects built (or stored) are tracked by ID as long as they
+    are referenced anywhere: until then every lookup returns the same
+    object, and changes made to it without saving are seen by later
+    lookups and written by the next snapshot, as with a dict. Unsaved
+    changes to an object that is no longer referenced are lost.
+    """
+
+    TIMESTAMP_ATTRIBUTES = ("created_at", "updated_at")
+    NULL_TIMESTAMP = -2 ** 63
+
+    def __init__(self, cls: type):
+        """
+        Initialize an empty store for a model class.
+
+        Args:
+            cls (type): The model class used to build the objects.
+        """
+        self.cls = cls
+        self.rows = {}
+        self.ids = []
+        self.columns = {}
+        self.live = weakref.WeakValueDictionary()
+
+    def __len__(self) -> int:
+        """Return the number of objects."""
+        return len(self.rows)
+
+    def __iter__(self):
+        """Iterate over the object IDs."""
+        return iter(list(self.rows))
+
+    def __contains__(self, obj_id: str) -> bool:
+        """Tell whether an object is stored under an ID."""
+        return obj_id in self.rows
+
+    def __getitem__(self, obj_id: str) -> Base:
+        """Return the object stored under an ID, built unless it is
+        still referenced."""
+        with _LOCK:
+            row = self.rows[obj_id]
+            obj = self.live.get(obj_id)
+            if obj is not None:
+                return obj
+            obj = self.cls.__new__(self.cls)
+            attributes = obj.__dict__
+            attributes['id'] = obj_id
+            for key, column in self.columns.items():
+                value = column[row]
+                if key in self.TIMESTAMP_ATTRIBUTES:
+                    value = self._to_datetime(value)
+                if value is not _MISSING:
+                    attributes[key] = value
+            self.live[obj_id] = obj
+        return obj
+
+    def __setitem__(self, obj_id: str, obj):
+        """Store an object, or its serialized form, under an ID."""
+        values = obj if type(obj) is dict else obj.__dict__
+        with _LOCK:
+            if type(obj) is dict:
+                self.live.pop(obj_id, None)
+            else:
+                self.live[obj_id] = obj
+            row = self.rows.get(obj_id)
+            if row is None:
+                row = len(self.ids)
+                self.rows[obj_id] = row
+                self.ids.append(obj_id)
+                for key, column in self.columns.items():
+                    column.append(self._missing(key))
+            for key in values:
+                if key != 'id' and key not in self.columns:
+                    self.columns[key] = self._new_column(key)
+            for key, column in self.columns.items():
+                value = values.get(key, _MISSING)
+                if key in self.TIMESTAMP_ATTRIBUTES:
+                    value = self._to_micros(value)
+                column[row] = value
+
+    def __delitem__(self, obj_id: str):
+        """Remove the object stored under an ID, moving the last row in
+        its place."""
+        with _LOCK:
+            row = self.rows.pop(obj_id)
+            self.live.pop(obj_id, None)
+            last = len(self.ids) - 1
+            if row != last:
+                last_id = self.ids[last]
+                self.ids[row] = last_id
+                self.rows[last_id] = row
+                for column in self.columns.values():
+                    column[row] = column[last]
+            self.ids.pop()
+            for column in self.columns.values():
+                column.pop()
+
+    def values(self) -> List[Base]:
+        """Return all the objects, built."""
+        return [self[obj_id] for obj_id in self]
+
+    def items(self) -> List[tuple]:
+        """Return all the (ID, object) pairs, objects built."""
+        return [(obj_id, self[obj_id]) for obj_id in self]
+
+    def raw_items(self) -> List[tuple]:
+        """Return all the (ID, object) pairs, serialized unless the
+        object is still referenced."""
+        with _LOCK:
+            items = []
+            for obj_id, row in self.rows.items():
+                obj = self.live.get(obj_id)
+                if obj is not None:
+                    items.append((obj_id, obj))
+                    continue
+                obj_json = {'id': obj_id}
+                for key, column in self.columns.items():
+                    value = column[row]
+                    if key in self.TIMESTAMP_ATTRIBUTES:
+                        value = self._to_datetime(value)
+                        if type(value) is datetime:
+                            value = value.strftime(TIMESTAMP_FORMAT)
+                    if value is not _MISSING:
+                        obj_json[key] = value
+                items.append((obj_id, obj_json))
+        return items
+
+    def _new_column(self, key: str):
+        """Create a column for a new attribute, for all existing rows."""
+        if key in self.TIMESTAMP_ATTRIBUTES:
+            return array('q', [self.NULL_TIMESTAMP] * len(self.ids))
+        return PackedColumn(len(self.ids))
+
+    def _missing(self, key: str):
+        """Return the value of a missing attribute in a column."""
+        if key in self.TIMESTAMP_ATTRIBUTES:
+            return self.NULL_TIMESTAMP
+        return _MISSING
+
+    def _to_micros(self, value) -> int:
+        """Convert a datetime (or serialized timestamp) for a column."""
+        if type(value) is str:
+            value = _parse_timestamp(value)
+        if type(value) is not datetime:
+            return self.NULL_TIMESTAMP
+        return (value - EPOCH) // timedelta(microseconds=1)
+
+    def _to_datetime(self, value: int):
+        """Convert a timestamp column value back to a datetime."""
+        if value == self.NULL_TIMESTAMP:
+            return _MISSING
+        return EPOCH + timedelta(microseconds=value)
+
+
+class PackedColumn:
+    """
+    Column of attribute values, used like a list, in which strings are
+    packed UTF-8 encoded in a single bytearray: a string costs its
+    encoded length plus 12 bytes (offset and length), instead of an
+    object of about 50 bytes plus its length and an 8-byte list slot.
+    None and missing values are flagged in the length; any other value
+    is kept aside by row.
+
+    Overwritten and removed strings leave garbage in the bytearray, which
+    is compacted once it outweighs the live strings.
+    """
+
+    MISSING = 0xFFFFFFFF
+    NONE = 0xFFFFFFFE
+    OTHER = 0xFFFFFFFD
+    COMPACT_MIN = 4096
+
+    def __init__(self, length: int = 0):
+        """
+        Initialize a column of missing values.
+
+        Args:
+            length (int): The number of rows.
+        """
+        self.data = bytearray()
+        self.starts = array('Q', [0] * length)
+        self.lengths = array('I', [self.MISSING] * length)
+        self.others = {}
+        self.garbage = 0
+
+    def __len__(self) -> int:
+        """Return the number of rows."""
+        return len(self.lengths)
+
+    def __getitem__(self, row: int):
+        """Return the value of a row (_MISSING if it has none)."""
+        length = self.lengths[row]
+        if length < self.OTHER:
+            start = self.starts[row]
+            return self.data[start:start + length].decode(
+                'utf-8', 'surrogatepass')
+        if length == self.MISSING:
+            return _MISSING
+        if length == self.NONE:
+            return None
+        return self.others[row]
+
+    def __setitem__(self, row: int, value):
+        """Set the value of a row."""
+        self._release(row)
+        if type(value) is str:
+            encoded = value.encode('utf-8', 'surrogatepass')
+            if len(encoded) < self.OTHER:
+                self.starts[row] = len(self.data)
+                self.lengths[row] = len(encoded)
+                self.data += encoded
+                self._compact()
+                return
+        if value is _MISSING:
+            self.lengths[row] = self.MISSING
+        elif value is None:
+            self.lengths[row] = self.NONE
+        else:
+            self.lengths[row] = self.OTHER
+            self.others[row] = value
+
+    def append(self, value):
+        """Add a row."""
+        self.starts.append(0)
+        self.lengths.append(self.MISSING)
+        self[len(self.lengths) - 1] = value
+
+    def pop(self):
+        """Remove the last row."""
+        row = len(self.lengths) - 1
+        self._release(row)
+        self.starts.pop()
+        self.lengths.pop()
+
+    def _release(self, row: int):
+        """Forget the value of a row."""
+        length = self.lengths[row]
+        if length < self.OTHER:
+            self.garbage += length
+        elif length == self.OTHER:
+            del self.others[row]
+
+    def _compact(self):
+        """Rewrite the bytearray without garbage, if it is mostly
+        garbage."""
+        if (self.garbage < self.COMPACT_MIN
+                or self.garbage * 2 < len(self.data)):
+            return
+        data = bytearray()
+        for row, length in enumerate(self.lengths):
+            if length < self.OTHER:
+                start = self.starts[row]
+                self.starts[row] = len(data)
+                data += self.data[start:start + length]
+        self.data = data
+        self.garbage = 0
+
+
+def _parse_timestamp(value) -> datetime:
+    """
+    Return the datetime of a serialized timestamp: a string in
+    TIMESTAMP_FORMAT, or a datetime as read from a binary snapshot.
+    """
+    if type(value) is datetime:
+        return value
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def _raw_items(objs) -> Iterable[tuple]:
+    """
+    Return the (ID, object) pairs of a DATA mapping, without building the
+    objects that are only held in serialized form.
+    """
+    raw_items = getattr(objs, "raw_items", None)
+    if raw_items is None:
+        return objs.items()
+    return raw_items()
+
+
+def _index_key(value):
+    """
+    Return the key under which a value is stored in an index.
+
+    Unhashable values all share a single bucket that is always
+    re-checked by the search filter.
+    """
+    try:
+        hash(value)
+    except TypeError:
+        return _UNHASHABLE
+    return value
+
+
+@atexit.register
+def flush_all():
+    """
+    Flush the write-behind queue of every class (run at exit).
+    """
+    for cls, _ in list(FLUSHERS.values()):
+        cls.flush()
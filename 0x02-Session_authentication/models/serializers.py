@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Snapshot serializers module
+"""
+
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, Tuple
+import json
+import struct
+
+
+EPOCH = datetime(1970, 1, 1)
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class JSONSerializer():
+    """
+    Text JSON snapshots: a single object mapping each ID to the
+    serialized object, with timestamps formatted as strings.
+    """
+
+    EXTENSION = "json"
+    BINARY = False
+
+    def __init__(self, timestamp_format: str):
+        """
+        Initialize the serializer.
+
+        Args:
+            timestamp_format (str): strftime format of the timestamps.
+        """
+        self.timestamp_format = timestamp_format
+
+    def serialize(self, obj) -> dict:
+        """
+        Serialize an object for the snapshot.
+
+        Args:
+            obj (Base): The object.
+
+        Returns:
+            dict: The object with all its attributes, JSON compatible.
+        """
+        return obj.to_json(True)
+
+    def dump(self, objs: Iterable[Tuple[str, dict]], f):
+        """
+        Write a snapshot.
+
+        Args:
+            objs (Iterable[Tuple[str, dict]]): (ID, serialized object) pairs.
+            f: The file, opened for writing in text mode.
+        """
+        def _default(value):
+            if type(value) is datetime:
+                return value.strftime(self.timestamp_format)
+            raise TypeError("{!r} is not JSON serializable".format(value))
+
+        json.dump(dict(objs), f, default=_default)
+
+    def load(self, f, stream: bool = False) -> Iterator[Tuple[str, dict]]:
+        """
+        Read a snapshot.
+
+        Args:
+            f: The file, opened for reading in text mode.
+            stream (bool): Parse the file incrementally instead of as a
+                whole (slower, but memory stays flat).
+
+        Returns:
+            Iterator[Tuple[str, dict]]: (ID, serialized object) pairs.
+        """
+        if stream:
+            return _iter_json_object(f)
+        return iter(json.load(f).items())
+
+
+class BinarySerializer():
+    """
+    Compact binary snapshots, made of:
+        - the MAGIC header,
+        - the table of attribute names (count, then each name),
+        - one length-prefixed record per object: the ID, the number of
+          attributes, then for each one the index of its name, a type
+          tag and the value.
+
+    Integers are little-endian, strings are length-prefixed UTF-8 and
+    datetimes are 64-bit microseconds since the epoch, so no timestamp
+    is formatted or parsed.
+    """
+
+    EXTENSION = "bin"
+    BINARY = True
+    MAGIC = b"BDB\x01"
+    NONE, STR, INT, FLOAT, BOOL, DATETIME, JSON = range(7)
+
+    def serialize(self, obj) -> dict:
+        """
+        Serialize an object for the snapshot.
+
+        Args:
+            obj (Base): The object.
+
+        Returns:
+            dict: The attributes of the object, datetimes kept as is.
+        """
+        return dict(obj.__dict__)
+
+    def dump(self, objs: Iterable[Tuple[str, dict]], f):
+        """
+        Write a snapshot.
+
+        Args:
+            objs (Iterable[Tuple[str, dict]]): (ID, serialized object) pairs.
+            f: The file, opened for writing in binary mode.
+        """
+        keys = {}
+        records = []
+        for obj_id, obj_dict in objs:
+            fields = [_pack_str(obj_id), _U16.pack(len(obj_dict))]
+            for key, value in obj_dict.items():
+                index = keys.get(key)
+                if index is None:
+                    index = keys[key] = _U16.pack(len(keys))
+                fields.append(index)
+                fields.append(self._pack_value(value))
+            body = b"".join(fields)
+            records.append(_U32.pack(len(body)))
+            records.append(body)
+
+        f.write(self.MAGIC)
+        f.write(_U16.pack(len(keys)))
+        f.write(b"".join(_pack_str(key) for key in keys))
+        f.write(b"".join(records))
+
+    def load(self, f, stream: bool = False) -> Iterator[Tuple[str, dict]]:
+        """
+        Read a snapshot, one record at a time.
+
+        Args:
+            f: The file, opened for reading in binary mode.
+            stream (bool): Unused, binary snapshots are always streamed.
+
+        Returns:
+            Iterator[Tuple[str, dict]]: (ID, serialized object) pairs.
+        """
+        if f.read(len(self.MAGIC)) != self.MAGIC:
+            raise ValueError("Not a binary snapshot")
+        count, = _U16.unpack(_read_exactly(f, 2))
+        keys = []
+        for _ in range(count):
+            size, = _U32.unpack(_read_exactly(f, 4))
+            keys.append(_read_exactly(f, size).decode("utf-8"))
+        return self._iter_records(f, keys)
+
+    def _iter_records(self, f, keys: list) -> Iterator[Tuple[str, dict]]:
+        """
+        Yield the (ID, serialized object) pairs of the records of a file.
+        """
+        while True:
+            header = f.read(4)
+            if not header:
+                return
+            size, = _U32.unpack(header)
+            body = _read_exactly(f, size)
+            obj_id, pos = _unpack_str(body, 0)
+            count, = _U16.unpack_from(body, pos)
+            pos += 2
+            obj_dict = {}
+            for _ in range(count):
+                index, = _U16.unpack_from(body, pos)
+                value, pos = self._unpack_value(body, pos + 2)
+                obj_dict[keys[index]] = value
+            yield obj_id, obj_dict
+
+    def _pack_value(self, value) -> bytes:
+        """
+        Encode a value as its type tag (one byte, NONE to JSON)
+        followed by its payload.
+        """
+        if value is None:
+            return b"\x00"
+        if type(value) is str:
+            data = value.encode("utf-8")
+            return b"\x01" + _U32.pack(len(data)) + data
+        if type(value) is bool:
+            return b"\x04\x01" if value else b"\x04\x00"
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return b"\x02" + _I64.pack(value)
+        if type(value) is float:
+            return b"\x03" + _F64.pack(value)
+        if type(value) is datetime:
+            return b"\x05" + _I64.pack((value - EPOCH) // _MICROSECOND)
+        return b"\x06" + _pack_str(json.dumps(value))
+
+    def _unpack_value(self, body: bytes, pos: int) -> tuple:
+        """
+        Decode the value at a position of a record.
+
+        Returns:
+            tuple: The value and the position right after it.
+        """
+        tag = body[pos]
+        pos += 1
+        if tag == self.STR:
+            return _unpack_str(body, pos)
+        if tag == self.NONE:
+            return None, pos
+        if tag == self.DATETIME:
+            micros, = _I64.unpack_from(body, pos)
+            return EPOCH + timedelta(0, 0, micros), pos + 8
+        if tag == self.BOOL:
+            return body[pos] != 0, pos + 1
+        if tag == self.INT:
+            return _I64.unpack_from(body, pos)[0], pos + 8
+        if tag == self.FLOAT:
+            return _F64.unpack_from(body, pos)[0], pos + 8
+        if tag == self.JSON:
+            text, pos = _unpack_str(body, pos)
+            return json.loads(text), pos
+        raise ValueError("Unknown type tag {}".format(tag))
+
+
+def is_binary_snapshot(file_path: str) -> bool:
+    """
+    Tell whether a snapshot file is in the binary format, whatever its
+    extension.
+
+    Args:
+        file_path (str): The path of the snapshot.
+
+    Returns:
+        bool: True if the file starts with the binary MAGIC header.
+    """
+    magic = BinarySerializer.MAGIC
+    with open(file_path, 'rb') as f:
+        return f.read(len(magic)) == magic
+
+
+def _pack_str(value: str) -> bytes:
+    """
+    Encode a string as its UTF-8 length followed by its UTF-8 bytes.
+    """
+    data = value.encode("utf-8")
+    return _U32.pack(len(data)) + data
+
+
+def _unpack_str(body: bytes, pos: int) -> tuple:
+    """
+    Decode the string at a position of a record.
+
+    Returns:
+        tuple: The string and the position right after it.
+    """
+    size, = _U32.unpack_from(body, pos)
+    pos += 4
+    return body[pos:pos + size].decode("utf-8"), pos + size
+
+
+def _read_exactly(f, size: int) -> bytes:
+    """
+    Read exactly size bytes from a file, or fail on a truncated file.
+    """
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Truncated binary snapshot")
+    return data
+
+
+def _iter_json_object(f, chunk_size: int = 1 << 16):
+    """
+    Yield the (key, value) pairs of the JSON object stored in a file,
+    reading it chunk by chunk instead of parsing it as a whole.
+
+    Args:
+        f: The file, opened for reading in text mode.
+        chunk_size (int): Number of characters read at a time.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def _read_more():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def _next_char() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\n\r":
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if eof:
+                raise ValueError("Unexpected end of JSON data")
+            _read_more()
+
+    def _next_value():
+        nonlocal pos
+        while True:
+            _next_char()
+            try:
+                value, pos = decoder.raw_decode(buf, pos)
+                return value
+            except ValueError:
+                if eof:
+                    raise
+                _read_more()
+
+    def _expect(chars: str) -> str:
+        nonlocal pos
+        char = _next_char()
+        if char not in chars:
+            raise ValueError("Expected one of {!r}, got {!r}".format(
+                chars, char))
+        pos += 1
+        return char
+
+    _expect("{")
+    if _next_char() == "}":
+        return
+    while True:
+        key = _next_value()
+        _expect(":")
+        yield key, _next_value()
+        if _expect(",}") == "}":
+            return
@@ -15,6 +15,8 @@ class User(Base):
         last_name (str): The last name of the user.
     """
 
+    INDEXED_ATTRIBUTES = ('email',)
+
     def __init__(self, *args: list, **kwargs: dict):
         """Initialize a User instance.
 
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests of the ColumnStore (COMPACT_STORAGE) layout.
+
+Usage: python3 -m unittest test_column_store
+"""
+import unittest
+
+from models.base import PackedColumn, _MISSING
+from models.user import User
+
+
+class ColumnStoreTest(unittest.TestCase):
+    """Identity and contents of the objects of a ColumnStore."""
+
+    def setUp(self):
+        """Create a store holding one user."""
+        self.compact = User.COMPACT_STORAGE
+        User.COMPACT_STORAGE = True
+        self.store = User._new_store()
+        user = User(email="bob@dylan.com", first_name="Bob")
+        user.password = "H0pe"
+        self.user_id = user.id
+        self.store[user.id] = user
+
+    def tearDown(self):
+        """Restore the storage layout."""
+        User.COMPACT_STORAGE = self.compact
+
+    def test_lookups_return_the_same_object_while_referenced(self):
+        """Two lookups of an ID give the same object."""
+        user = self.store[self.user_id]
+        self.assertIs(self.store[self.user_id], user)
+        self.assertIs(self.store.get(self.user_id), user)
+
+    def test_unsaved_changes_are_seen_while_referenced(self):
+        """Changes to a referenced object are seen and snapshotted."""
+        user = self.store[self.user_id]
+        user.last_name = "Dylan"
+        self.assertEqual(self.store[self.user_id].last_name, "Dylan")
+        self.assertEqual(dict(self.store.raw_items())[self.user_id], user)
+
+    def test_unsaved_changes_are_lost_once_unreferenced(self):
+        """An object no longer referenced is rebuilt from its columns."""
+        user = self.store[self.user_id]
+        user.last_name = "Dylan"
+        del user
+        user = self.store[self.user_id]
+        self.assertIsNone(user.last_name)
+        self.assertEqual(user.email, "bob@dylan.com")
+        self.assertEqual(user.first_name, "Bob")
+        self.assertTrue(user.is_valid_password("H0pe"))
+
+    def test_stored_changes_are_kept(self):
+        """Storing an object again keeps its changes."""
+        user = self.store[self.user_id]
+        user.last_name = "Dylan"
+        self.store[self.user_id] = user
+        created_at = user.created_at
+        del user
+        user = self.store[self.user_id]
+        self.assertEqual(user.last_name, "Dylan")
+        self.assertEqual(user.created_at, created_at)
+
+    def test_delete_moves_the_last_row(self):
+        """Removing an object keeps the others intact."""
+        other = User(email="joan@baez.com")
+        self.store[other.id] = other
+        other_id = other.id
+        del other
+        del self.store[self.user_id]
+        self.assertNotIn(self.user_id, self.store)
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.store[other_id].email, "joan@baez.com")
+
+
+class PackedColumnTest(unittest.TestCase):
+    """Values of a PackedColumn."""
+
+    def test_values(self):
+        """Strings, None, missing and other values are kept."""
+        column = PackedColumn(1)
+        for value in ("abc", "", "hé \U0001f600", None, 42, [1]):
+            column.append(value)
+        self.assertIs(column[0], _MISSING)
+        self.assertEqual([column[row] for row in range(1, len(column))],
+                         ["abc", "", "hé \U0001f600", None, 42, [1]])
+        column.pop()
+        column[4] = "x"
+        self.assertEqual(len(column), 6)
+        self.assertEqual(column[4], "x")
+        self.assertEqual(column.others, {5: 42})
+
+    def test_compaction(self):
+        """Overwritten strings are compacted away."""
+        column = PackedColumn()
+        for row in range(100):
+            column.append("value {}".format(row))
+        for _ in range(1000):
+            column[0] = "a longer string than the others"
+        self.assertLess(len(column.data), 2 * column.COMPACT_MIN)
+        self.assertEqual(column[0], "a longer string than the others")
+        self.assertEqual(column[99], "value 99")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tests of the session views.
+
+Usage: python3 -m unittest test_session_auth_views
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from models.user import User
+
+
+class LogoutEverywhereTest(unittest.TestCase):
+    """DELETE /api/v1/users/<user_id>/sessions."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Load the app with session authentication, in a temporary
+        directory for the users file."""
+        cls.cwd = os.getcwd()
+        cls.directory = tempfile.mkdtemp()
+        os.chdir(cls.directory)
+        with mock.patch.dict(os.environ, {'AUTH_TYPE': "session_auth"}):
+            from api.v1 import app
+        cls.auth = app.auth
+        cls.client = app.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Leave the temporary directory."""
+        os.chdir(cls.cwd)
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        """Create two users, each with a session."""
+        self.environment = mock.patch.dict(
+            os.environ, {'SESSION_NAME': "_my_session_id"})
+        self.environment.start()
+        self.users = []
+        for email in ("bob@dylan.com", "joan@baez.com"):
+            user = User(email=email)
+            user.password = "H0pe"
+            user.save()
+            self.users.append(user)
+        self.session_ids = [self.auth.create_session(user.id)
+                            for user in self.users]
+
+    def tearDown(self):
+        """Remove the users."""
+        for user in self.users:
+            self.auth.destroy_all_sessions(user.id)
+            user.remove()
+        self.environment.stop()
+
+    def delete(self, user_id: str):
+        """Destroy the sessions of user_id as the first user."""
+        self.client.set_cookie("_my_session_id", self.session_ids[0])
+        return self.client.delete(
+            "/api/v1/users/{}/sessions".format(user_id))
+
+    def test_other_user_is_forbidden(self):
+        """The sessions of another user are left alone."""
+        response = self.delete(self.users[1].id)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(
+            self.auth.user_id_for_session_id(self.session_ids[1]),
+            self.users[1].id)
+
+    def test_own_sessions(self):
+        """A user destroys their sessions, by ID or as "me"."""
+        for user_id in (self.users[0].id, "me"):
+            second = self.auth.create_session(self.users[0].id)
+            response = self.delete(user_id)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json(), {"sessions": 2})
+            self.assertIsNone(self.auth.user_id_for_session_id(second))
+            self.session_ids[0] = self.auth.create_session(self.users[0].id)
+
+
+if __name__ == "__main__":
+    unittest.main()
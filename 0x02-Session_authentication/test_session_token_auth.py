@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tests of the signed session tokens and their deny-list.
+
+Usage: python3 -m unittest test_session_token_auth
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from api.v1.auth.session_token_auth import DenyList, SessionTokenAuth
+
+ENVIRONMENT = ('SESSION_SECRET', 'SESSION_SECRET_PATH', 'SESSION_STORE',
+               'SESSION_STORE_PATH', 'SESSION_DURATION')
+
+
+class DenyListTest(unittest.TestCase):
+    """Expiry of the in-memory deny-list."""
+
+    def test_user_revoked_twice_with_the_same_deadline(self):
+        """Revoking a user twice in a second expires cleanly."""
+        deny_list = DenyList()
+        now = int(time.time())
+        deny_list.add_user("user", now, now + 10)
+        deny_list.add_user("user", now, now + 10)
+        self.assertEqual(deny_list.revoked_at("user"), now)
+        with mock.patch("api.v1.auth.session_token_auth.time") as clock:
+            clock.time.return_value = now + 20
+            self.assertEqual(len(deny_list), 0)
+            deny_list.add_user("user", now + 20, now + 30)
+            deny_list.add(b"signature", now + 30)
+        self.assertEqual(deny_list.revoked_at("user"), now + 20)
+        self.assertIn(b"signature", deny_list)
+
+    def test_user_revoked_again_later(self):
+        """A later revocation of a user outlives the earlier one."""
+        deny_list = DenyList()
+        now = int(time.time())
+        deny_list.add_user("user", now, now + 10)
+        deny_list.add_user("user", now + 5, now + 15)
+        with mock.patch("api.v1.auth.session_token_auth.time") as clock:
+            clock.time.return_value = now + 12
+            self.assertEqual(len(deny_list), 1)
+        self.assertEqual(deny_list.revoked_at("user"), now + 5)
+
+
+class SessionTokenAuthTest(unittest.TestCase):
+    """Revocation of tokens between instances (workers)."""
+
+    def setUp(self):
+        """Clear the session environment."""
+        self.environment = {name: os.environ.pop(name)
+                            for name in ENVIRONMENT if name in os.environ}
+        self.directory = tempfile.mkdtemp()
+        os.environ['SESSION_SECRET_PATH'] = os.path.join(
+            self.directory, "session_secret")
+
+    def tearDown(self):
+        """Restore the session environment."""
+        for name in ENVIRONMENT:
+            os.environ.pop(name, None)
+        os.environ.update(self.environment)
+        shutil.rmtree(self.directory)
+
+    def test_secret_without_a_store(self):
+        """A shared secret needs no store: revocations are per process."""
+        os.environ['SESSION_SECRET'] = "secret"
+        worker, other = SessionTokenAuth(), SessionTokenAuth()
+        self.assertIsNone(worker.deny_list.store)
+        token = worker.create_session("user")
+        self.assertEqual(other.user_id_for_session_id(token), "user")
+        time.sleep(0.002)
+        worker.destroy_all_sessions("user")
+        self.assertIsNone(worker.user_id_for_session_id(token))
+        self.assertEqual(other.user_id_for_session_id(token), "user")
+
+    def test_generated_key_is_shared(self):
+        """Without SESSION_SECRET, the processes share a generated key."""
+        token = SessionTokenAuth().create_session("user")
+        self.assertEqual(
+            SessionTokenAuth().user_id_for_session_id(token), "user")
+        os.environ['SESSION_SECRET_PATH'] += ".other"
+        self.assertIsNone(
+            SessionTokenAuth().user_id_for_session_id(token))
+
+    def test_revocations_are_shared(self):
+        """Tokens revoked by a worker are rejected by the others."""
+        os.environ['SESSION_SECRET'] = "secret"
+        os.environ['SESSION_STORE'] = "sqlite"
+        os.environ['SESSION_STORE_PATH'] = os.path.join(
+            self.directory, "sessions.sqlite")
+        worker, other = SessionTokenAuth(), SessionTokenAuth()
+        token = worker.create_session("user")
+        logged_out = worker.create_session("other")
+        self.assertEqual(other.user_id_for_session_id(token), "user")
+
+        request = mock.Mock()
+        request.cookies = {"_my_session_id": logged_out}
+        with mock.patch.dict(os.environ, {'SESSION_NAME': "_my_session_id"}):
+            self.assertTrue(worker.destroy_session(request))
+        self.assertIsNone(other.user_id_for_session_id(logged_out))
+
+        time.sleep(0.002)
+        worker.destroy_all_sessions("user")
+        self.assertIsNone(other.user_id_for_session_id(token))
+        self.assertIsNone(SessionTokenAuth().user_id_for_session_id(token))
+
+    def test_login_just_after_logout_everywhere(self):
+        """A token issued right after destroy_all_sessions is valid."""
+        auth = SessionTokenAuth()
+        old = auth.create_session("user")
+        time.sleep(0.002)
+        auth.destroy_all_sessions("user")
+        new = auth.create_session("user")
+        self.assertIsNone(auth.user_id_for_session_id(old))
+        self.assertEqual(auth.user_id_for_session_id(new), "user")
+
+
+if __name__ == "__main__":
+    unittest.main()
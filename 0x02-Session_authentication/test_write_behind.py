@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests of the WRITE_BEHIND background flusher.
+
+Usage: python3 -m unittest test_write_behind
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from models import base
+from models.user import User
+
+
+class FlusherTest(unittest.TestCase):
+    """Failures of the background flusher."""
+
+    def setUp(self):
+        """Write behind, often, in a temporary directory."""
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+        self.settings = (User.WRITE_BEHIND, User.FLUSH_INTERVAL)
+        User.WRITE_BEHIND, User.FLUSH_INTERVAL = True, 0.01
+
+    def tearDown(self):
+        """Restore the settings and leave the temporary directory."""
+        User.flush()
+        User.WRITE_BEHIND, User.FLUSH_INTERVAL = self.settings
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def wait(self, condition) -> None:
+        """Wait (up to a second) for condition() to be true."""
+        deadline = time.time() + 1
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_failures_are_logged_and_retried(self):
+        """A failing flush is logged once and its mutations are kept."""
+        full = OSError(28, "No space left on device")
+        with self.assertLogs("models.base") as logs:
+            with mock.patch.object(User, "save_to_file",
+                                   side_effect=full) as save_to_file:
+                user = User(email="bob@dylan.com")
+                user.save()
+                self.wait(lambda: save_to_file.call_count >= 3)
+            self.wait(lambda: len(logs.records) == 2)
+        self.assertEqual([record.levelname for record in logs.records],
+                         ["ERROR", "WARNING"])
+        self.assertNotIn("User", base.PENDING)
+        with open(".db_User.json") as snapshot:
+            self.assertIn(user.id, snapshot.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,15 +2,40 @@
 """User authentication service module using Flask.
 """
 
+import hmac
+from io import TextIOWrapper
+from os import getenv
+
 from flask import Flask, jsonify, request, abort, redirect, Response
 
 from auth import Auth
+from bulk_register import read_users
+from hashing import HashingBusy
 
 AUTH = Auth()
+# About 1000 records, minutes of bcrypt: larger imports go through the
+# bulk_register.py command line
+BULK_MAX_BYTES = int(getenv("BULK_MAX_BYTES", 64 * 1024))
 
 app = Flask(__name__)
 
 
+@app.teardown_appcontext
+def remove_db_session(exception=None) -> None:
+    """Release the database session of the request's thread.
+    """
+    AUTH.remove_db_session()
+
+
+@app.errorhandler(HashingBusy)
+def hashing_busy(error) -> Response:
+    """This handler answers 503 when the password hashing pool is full.
+    """
+    response = jsonify({"message": "Service unavailable"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
 @app.route('/', methods=['GET'])
 def root() -> str:
     """This route handles the root endpoint.
@@ -32,6 +57,34 @@ def users() -> Response:
         return jsonify({"message": "Email already registered"}), 400
 
 
+@app.route('/users/bulk', methods=['POST'])
+def bulk_users() -> Response:
+    """This route registers the users of a CSV (text/csv) or JSONL body,
+    read as it is streamed.
+
+    It takes the BULK_REGISTER_TOKEN as a bearer token (it is disabled
+    without one), and a body of at most BULK_MAX_BYTES. Passwords are
+    hashed in the BCRYPT_POOL_SIZE worker processes: without them, the
+    route answers 503 rather than hash the whole body on the request
+    thread.
+    """
+    token = getenv("BULK_REGISTER_TOKEN")
+    authorization = request.headers.get("Authorization", "")
+    if not token or not hmac.compare_digest(
+            authorization.encode(), "Bearer {}".format(token).encode()):
+        abort(403)
+    if not AUTH.hashing_workers:
+        return jsonify({"message": "Bulk registration needs a hashing "
+                                   "pool (BCRYPT_POOL_SIZE)"}), 503
+    if request.content_length is None:
+        abort(411)
+    if request.content_length > BULK_MAX_BYTES:
+        abort(413)
+    fmt = "csv" if request.mimetype == "text/csv" else "jsonl"
+    stream = TextIOWrapper(request.stream, encoding="utf-8", newline="")
+    return jsonify(AUTH.register_users(read_users(stream, fmt)))
+
+
 @app.route('/sessions', methods=['POST'])
 def login() -> Response:
     """This route handles user login and session creation.
@@ -97,6 +150,8 @@ def update_password() -> str:
     try:
         AUTH.update_password(reset_token, new_password)
         return jsonify({"email": email, "message": "Password updated"}), 200
+    except HashingBusy:
+        raise
     except Exception:
         abort(403)
 
@@ -2,21 +2,22 @@
 """Auth module to interact with the authentication database"""
 
 
-import bcrypt
+from bulk_register import register_users
 from db import DB
+from hashing import Hasher, HashingBusy, hash_password
+from session_cache import SessionCache
 from user import User
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 from uuid import uuid4
 
-from typing import Optional
+from typing import Iterable, Optional, Tuple
 
 
 def _hash_password(password: str) -> bytes:
     """Hashes the input password using bcrypt.hashpw
     """
-    salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed_password
+    return hash_password(password)
 
 
 def _generate_uuid() -> str:
@@ -27,12 +28,18 @@ def _generate_uuid() -> str:
 
 class Auth:
     """Auth class to interact with the authentication database.
+
+    bcrypt runs inline, or in the worker pool configured by
+    BCRYPT_POOL_SIZE and BCRYPT_QUEUE_SIZE (see Hasher), in which case
+    hashing methods raise HashingBusy when the pool is full.
     """
 
     def __init__(self):
         """Initializes the Auth class.
         """
         self._db = DB()
+        self.session_cache = SessionCache()
+        self._hasher = Hasher.from_env()
 
     def register_user(self, email: str, password: str) -> User:
         """Registers a new user with the given email and password."""
@@ -40,10 +47,28 @@ class Auth:
             self._db.find_user_by(email=email)
             raise ValueError('User {} already exists'.format(email))
         except NoResultFound:
-            hashed_password = _hash_password(password)
-            user = self._db.add_user(email, hashed_password)
+            # No connection is held while bcrypt runs
+            self._db.remove_session()
+            hashed_password = self._hasher.hash_password(password)
+            try:
+                user = self._db.add_user(email, hashed_password)
+            except IntegrityError:
+                # Registered concurrently, since the lookup above
+                raise ValueError('User {} already exists'.format(email))
             return user
 
+    @property
+    def hashing_workers(self) -> int:
+        """Returns the number of hashing processes (0 when inline).
+        """
+        return self._hasher.size
+
+    def register_users(self, users: Iterable[Tuple[str, str]]) -> dict:
+        """Registers many (email, password) users in batches (see
+        bulk_register.register_users) through the hashing pool, and
+        returns the counts of created, duplicate and invalid records."""
+        return register_users(self._db, users, hasher=self._hasher)
+
     def valid_login(self, email: str, password: str) -> bool:
         """Check if the login credentials are valid.
         """
@@ -51,7 +76,26 @@ class Auth:
             user = self._db.find_user_by(email=email)
         except NoResultFound:
             return False
-        return bcrypt.checkpw(password.encode('utf-8'), user.hashed_password)
+        # No connection is held while bcrypt runs
+        self._db.remove_session()
+        if not self._hasher.check_password(password, user.hashed_password):
+            return False
+        if self._hasher.needs_rehash(user.hashed_password):
+            self._rehash(user.id, password)
+        return True
+
+    def _rehash(self, user_id: int, password: str) -> None:
+        """Upgrade the stored hash of a user to the current work factor.
+        """
+        try:
+            hashed_password = self._hasher.hash_password(password)
+        except HashingBusy:
+            # Upgraded on a later login
+            return
+        try:
+            self._db.update_user(user_id, hashed_password=hashed_password)
+        except NoResultFound:
+            pass
 
     def create_session(self, email: str) -> str:
         """Create a session for the user with the given email
@@ -62,28 +106,46 @@ class Auth:
             return None
 
         session_id = _generate_uuid()
-        user.session_id = session_id
+        self._db.update_user(user.id, session_id=session_id)
+        self.session_cache.invalidate_user(user.id)
         return session_id
 
     def get_user_from_session_id(self, session_id: str) -> User:
         """Get the user corresponding to the given session ID.
+
+        Hot sessions are served from the session cache, as a detached
+        User holding only its id, email and session_id.
         """
         if session_id is None:
             return None
+        cached = self.session_cache.get(session_id)
+        if cached is not None:
+            return User(id=cached[0], email=cached[1], session_id=session_id)
+        generation = self.session_cache.generation
         try:
             user = self._db.find_user_by(session_id=session_id)
         except NoResultFound:
             return None
         else:
+            self.session_cache.put(session_id, user.id, user.email,
+                                   generation)
             return user
 
     def destroy_session(self, user_id: int) -> None:
         """Destroy the session for the user with the given user ID.
         """
-        user = self._db.find_user_by(user_id).session_id
-        user.session_id = None
+        try:
+            self._db.update_user(user_id, session_id=None)
+        except NoResultFound:
+            pass
+        self.session_cache.invalidate_user(user_id)
         return None
 
+    def remove_db_session(self) -> None:
+        """Release the database session of the current thread.
+        """
+        self._db.remove_session()
+
     def get_reset_password_token(self, email: str) -> str:
         """Get the reset password token for the user with the given email.
         """
@@ -93,7 +155,7 @@ class Auth:
             raise ValueError
         else:
             reset_token = _generate_uuid()
-            user.reset_token = reset_token
+            self._db.update_user(user.id, reset_token=reset_token)
             return reset_token
 
     def update_password(self, reset_token: str, password: str) -> None:
@@ -104,5 +166,9 @@ class Auth:
         except NoResultFound:
             raise ValueError("Invalid reset token")
 
-        user.hashed_password = _hash_password(password)
-        user.reset_token = None
+        # No connection is held while bcrypt runs
+        self._db.remove_session()
+        hashed_password = self._hasher.hash_password(password)
+        self._db.update_user(user.id, hashed_password=hashed_password,
+                             reset_token=None)
+        self.session_cache.invalidate_user(user.id)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Login throughput (Auth.valid_login) of concurrent request threads, with
+bcrypt inline and in a worker pool of 1, 2, 4... processes, plus the
+share of logins rejected (HashingBusy, answered 503) when the pool
+queue is full.
+
+Usage: ./benchmark_logins.py [logins] [max_pool_size]
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from auth import Auth
+from hashing import Hasher, HashingBusy
+
+THREADS = 16
+
+
+def measure(auth: Auth, logins: int) -> tuple:
+    """Return the logins per second and the number of rejected logins."""
+    def login(_):
+        try:
+            return auth.valid_login("bob@example.com", "MyPwdOfBob")
+        except HashingBusy:
+            return None
+        finally:
+            auth.remove_db_session()
+
+    start = time.time()
+    with ThreadPoolExecutor(THREADS) as executor:
+        results = list(executor.map(login, range(logins)))
+    elapsed = time.time() - start
+    rejected = results.count(None)
+    return (logins - rejected) / elapsed, rejected
+
+
+if __name__ == "__main__":
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    max_size = int(sys.argv[2]) if len(sys.argv) > 2 \
+        else os.cpu_count() or 1
+    os.environ.setdefault(
+        "DB_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "a.db"))
+    auth = Auth()
+    auth.register_user("bob@example.com", "MyPwdOfBob")
+
+    print("logins: {}, threads: {}, cpus: {}".format(
+        logins, THREADS, os.cpu_count()))
+    rate, _ = measure(auth, logins)
+    print("inline: {:.1f} logins/s".format(rate))
+    size = 1
+    while size <= max_size:
+        auth._hasher = Hasher(size, THREADS)
+        rate, _ = measure(auth, logins)
+        auth._hasher.shutdown()
+        auth._hasher = Hasher(size, 0)
+        _, rejected = measure(auth, logins)
+        auth._hasher.shutdown()
+        print("pool of {}: {:.1f} logins/s, {:.0%} rejected without "
+              "a queue".format(size, rate, rejected / logins))
+        size *= 2
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Latency of DB.find_user_by on email, session_id and reset_token in a
+users table of many rows, with the lookup indexes and without them
+(as in the tables created before they were added).
+
+Usage: ./benchmark_lookups.py [number_of_rows]
+"""
+import os
+import random
+import sys
+import tempfile
+import timeit
+from uuid import uuid4
+
+from sqlalchemy import text
+
+from db import DB
+from user import User
+
+COLUMNS = ("email", "session_id", "reset_token")
+
+
+def measure(db: DB, values: dict, lookups: int) -> dict:
+    """Return the mean time (in seconds) of a lookup by each column."""
+    times = {}
+    for column in COLUMNS:
+        sample = random.sample(values[column], lookups)
+
+        def run():
+            for value in sample:
+                db.find_user_by(**{column: value})
+                db.remove_session()
+        times[column] = timeit.timeit(run, number=1) / lookups
+    return times
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "users.db")
+    db = DB(url)
+    values = {column: [] for column in COLUMNS}
+    rows = []
+    for i in range(count):
+        row = {"email": "user{}@example.com".format(i),
+               "hashed_password": "x",
+               "session_id": str(uuid4()),
+               "reset_token": str(uuid4())}
+        for column in COLUMNS:
+            values[column].append(row[column])
+        rows.append(row)
+    with db._engine.begin() as connection:
+        connection.execute(User.__table__.insert(), rows)
+    del rows
+
+    indexed = measure(db, values, 1000)
+    with db._engine.begin() as connection:
+        for index in User.__table__.indexes:
+            connection.execute(text("DROP INDEX {}".format(index.name)))
+    scanned = measure(db, values, 10)
+
+    print("rows: {}".format(count))
+    for column in COLUMNS:
+        print("{}: {:.1f} ms without index, {:.3f} ms with index".format(
+            column, scanned[column] * 1e3, indexed[column] * 1e3))
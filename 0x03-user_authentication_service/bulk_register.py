@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Bulk user registration module
+
+Usage: ./bulk_register.py <users.csv | users.jsonl | -> [--format csv|jsonl]
+       [--batch-size N] [--workers N]
+
+CSV files have an email,password header; JSONL files hold one
+{"email": ..., "password": ...} object per line.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from itertools import islice
+from typing import Callable, Iterable, Iterator, TextIO, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from db import DB
+from hashing import Hasher
+
+BATCH_SIZE = 1000
+
+
+def read_users(stream: TextIO, fmt: str) -> Iterator[Tuple[str, str]]:
+    """Yield the (email, password) of each record of a CSV or JSONL
+    stream, read line by line ((None, None) for invalid records: missing
+    or empty values, or values that are not strings)
+    """
+    if fmt == "csv":
+        records = csv.DictReader(stream)
+    else:
+        records = (_parse_json(line) for line in stream if line.strip())
+    for record in records:
+        email = record.get("email")
+        password = record.get("password")
+        if not (isinstance(email, str) and email
+                and isinstance(password, str) and password):
+            yield None, None
+        else:
+            yield email, password
+
+
+def _parse_json(line: str) -> dict:
+    """Parse a JSONL record ({} if it is invalid)
+    """
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return {}
+    return record if isinstance(record, dict) else {}
+
+
+def register_users(db: DB, users: Iterable[Tuple[str, str]],
+                   batch_size: int = BATCH_SIZE, hasher: Hasher = None,
+                   progress: Callable[[dict], None] = None) -> dict:
+    """Register users in batches and return the counts of created,
+    duplicate (already registered, or repeated) and invalid records
+
+    Each batch costs one query for the emails already registered, one
+    bcrypt run through hasher (default: inline; see Hasher.map), and
+    one insert transaction. progress is called with the counts after
+    each batch.
+    """
+    counts = {"created": 0, "duplicate": 0, "invalid": 0}
+    if hasher is None:
+        hasher = Hasher()
+    users = iter(users)
+    while True:
+        batch = list(islice(users, batch_size))
+        if not batch:
+            break
+        new_users = {}
+        for email, password in batch:
+            if email is None:
+                counts["invalid"] += 1
+            elif email in new_users:
+                counts["duplicate"] += 1
+            else:
+                new_users[email] = password
+        for email in db.find_existing_emails(new_users):
+            del new_users[email]
+            counts["duplicate"] += 1
+        db.remove_session()
+
+        hashes = hasher.hash_passwords(new_users.values())
+        rows = [{"email": email, "hashed_password": hashed}
+                for email, hashed in zip(new_users, hashes)]
+        created = _insert(db, rows)
+        counts["created"] += created
+        counts["duplicate"] += len(rows) - created
+        if progress is not None:
+            progress(dict(counts))
+    return counts
+
+
+def _insert(db: DB, rows: list) -> int:
+    """Insert a batch of users in one transaction, leaving out those
+    registered concurrently since the batch was checked, and return the
+    number of users inserted
+    """
+    try:
+        if rows:
+            try:
+                db.add_users(rows)
+            except IntegrityError:
+                existing = db.find_existing_emails(
+                    row["email"] for row in rows)
+                rows = [row for row in rows if row["email"] not in existing]
+                db.add_users(rows)
+        return len(rows)
+    finally:
+        db.remove_session()
+
+
+def main() -> None:
+    """Register the users of a CSV or JSONL file (- for stdin)
+    """
+    parser = argparse.ArgumentParser(description="Bulk user registration")
+    parser.add_argument("file", help="CSV or JSONL file, - for stdin")
+    parser.add_argument("--format", choices=("csv", "jsonl"),
+                        help="default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="hashing processes (default: one per core)")
+    args = parser.parse_args()
+
+    fmt = args.format
+    if fmt is None:
+        fmt = "csv" if args.file.endswith(".csv") else "jsonl"
+
+    def report(counts: dict) -> None:
+        print("\r{created} created, {duplicate} duplicate, "
+              "{invalid} invalid".format(**counts), end="", file=sys.stderr)
+
+    stream = sys.stdin if args.file == "-" else \
+        open(args.file, newline="", encoding="utf-8")
+    hasher = Hasher(args.workers or os.cpu_count() or 1)
+    try:
+        with stream:
+            counts = register_users(DB(), read_users(stream, fmt),
+                                    args.batch_size, hasher, report)
+    finally:
+        hasher.shutdown()
+    print(file=sys.stderr)
+    print(json.dumps(counts))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,113 @@
 #!/usr/bin/env python3
 """DB module
 """
-from sqlalchemy import create_engine
+from os import getenv
+from typing import Iterable, List
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.session import Session
-from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 
 from user import Base, User
 
+DEFAULT_URL = "sqlite:///a.db"
+
+_engines = {}
+
+
+def get_engine(url: str) -> Engine:
+    """Return the engine of a database URL, created (with its connection
+    pool and schema) the first time only
+    """
+    if url not in _engines:
+        options = {"echo": False, "pool_pre_ping": True}
+        parsed = make_url(url)
+        # In-memory SQLite lives in a single connection: no pool to size
+        if not (parsed.get_backend_name() == "sqlite"
+                and parsed.database in (None, "", ":memory:")):
+            options["pool_size"] = int(getenv("DB_POOL_SIZE", 5))
+            options["max_overflow"] = int(getenv("DB_MAX_OVERFLOW", 10))
+        engine = create_engine(url, **options)
+        # Creates the missing tables only: existing data is kept
+        Base.metadata.create_all(engine)
+        migrate(engine)
+        _engines[url] = engine
+    return _engines[url]
+
+
+def migrate(engine: Engine) -> None:
+    """Create the indexes missing from tables created by older versions
+    (such as the lookup indexes of the users table in an existing a.db)
+
+    Raises IntegrityError if existing rows break a unique index.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
 
 class DB:
     """DB class
+
+    The database URL is taken from the DB_URL environment variable
+    (default: sqlite:///a.db). Each thread gets its own session, to be
+    released with remove_session at the end of each request.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, url: str = None) -> None:
         """Initialize a new DB instance
         """
-        self._engine = create_engine("sqlite:///a.db", echo=False)
-        Base.metadata.drop_all(self._engine)
-        Base.metadata.create_all(self._engine)
-        self.__session = None
+        self._engine = get_engine(url or getenv("DB_URL", DEFAULT_URL))
+        self._sessions = scoped_session(
+            sessionmaker(bind=self._engine, expire_on_commit=False))
 
     @property
     def _session(self) -> Session:
-        """Memoized session object
+        """Session object of the current thread
+        """
+        return self._sessions()
+
+    def remove_session(self) -> None:
+        """Close the session of the current thread
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        self._sessions.remove()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """Add a new user to the database
         """
         new_user = User(email=email, hashed_password=hashed_password)
         self._session.add(new_user)
-        self._session.commit()
+        try:
+            self._session.commit()
+        except IntegrityError:
+            self._session.rollback()
+            raise
         return new_user
 
+    def add_users(self, users: List[dict]) -> None:
+        """Add many users (dicts of email and hashed_password) to the
+        database, in a single transaction
+        """
+        try:
+            self._session.execute(insert(User), users)
+            self._session.commit()
+        except IntegrityError:
+            self._session.rollback()
+            raise
+
+    def find_existing_emails(self, emails: Iterable[str]) -> set:
+        """Return those of the given emails that are already registered,
+        in a single query
+        """
+        query = self._session.query(User.email).filter(
+            User.email.in_(list(emails)))
+        return {email for email, in query}
+
     def find_user_by(self, **kwargs) -> User:
         """Find a user by the given keyword arguments
         """
@@ -63,5 +131,9 @@ class DB:
                 raise ValueError(f"Invalid attribute: {key}")
             setattr(user, key, value)
 
-        self._session.commit()
+        try:
+            self._session.commit()
+        except IntegrityError:
+            self._session.rollback()
+            raise
         return None
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Password hashing module
+"""
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from itertools import repeat
+from multiprocessing import get_context
+from os import getenv
+from threading import BoundedSemaphore, Lock
+from time import perf_counter
+from typing import Callable, Iterable, Iterator
+
+import bcrypt
+
+# bcrypt's default, used before calibration: calibrating only raises it
+MIN_ROUNDS = 12
+MAX_ROUNDS = 16
+DEFAULT_TARGET_MS = 250
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool has no room for another job
+    """
+
+
+def calibrate_rounds(target_ms: float = DEFAULT_TARGET_MS) -> int:
+    """Return the highest bcrypt work factor whose verification takes
+    at most target_ms on this machine, within [MIN_ROUNDS, MAX_ROUNDS]
+    (MIN_ROUNDS even on a machine too slow for the target)
+
+    A cheap hash is timed (best of 3), and each extra round doubles the
+    cost.
+    """
+    probe_rounds = 6
+    hashed = bcrypt.hashpw(b"calibration", bcrypt.gensalt(probe_rounds))
+    timings = []
+    for _ in range(3):
+        start = perf_counter()
+        bcrypt.checkpw(b"calibration", hashed)
+        timings.append(perf_counter() - start)
+    budget = target_ms / (min(timings) * 1000)
+    rounds = probe_rounds
+    while rounds < MAX_ROUNDS and 2 ** (rounds + 1 - probe_rounds) <= budget:
+        rounds += 1
+    return max(rounds, MIN_ROUNDS)
+
+
+@lru_cache(maxsize=None)
+def default_rounds() -> int:
+    """Return the work factor set by BCRYPT_ROUNDS, or else calibrated
+    (once per process) for BCRYPT_TARGET_MS (default: DEFAULT_TARGET_MS)
+    """
+    rounds = getenv("BCRYPT_ROUNDS")
+    if rounds:
+        return int(rounds)
+    return calibrate_rounds(float(getenv("BCRYPT_TARGET_MS",
+                                         DEFAULT_TARGET_MS)))
+
+
+def hash_rounds(hashed_password: bytes) -> int:
+    """Return the work factor of a bcrypt hash ($2b$<rounds>$...)
+    """
+    return int(hashed_password.split(b"$")[2])
+
+
+def hash_password(password: str, rounds: int = None) -> bytes:
+    """Hashes the input password using bcrypt.hashpw, with the given work
+    factor (default: default_rounds())
+    """
+    salt = bcrypt.gensalt(rounds or default_rounds())
+    return bcrypt.hashpw(password.encode('utf-8'), salt)
+
+
+def check_password(password: str, hashed_password: bytes) -> bool:
+    """Checks a password against its bcrypt hash
+    """
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+
+
+class Hasher:
+    """Runs bcrypt inline, or in a bounded pool of worker processes
+
+    With a pool, at most size + queue_size jobs are in flight: past
+    that, run raises HashingBusy at once instead of queueing, so
+    requests fail fast (503) under a login storm. The pool is started
+    on first use, its workers forked from a fork server (forking the
+    threaded server itself could deadlock), and replaced when one of
+    them dies: the jobs it broke are run once more in the new pool.
+
+    New hashes use the work factor rounds (default: default_rounds());
+    needs_rehash tells which stored hashes use a lower, outdated one.
+    """
+
+    def __init__(self, size: int = 0, queue_size: int = None,
+                 rounds: int = None) -> None:
+        """Initialize a hasher (inline when size is 0)
+        """
+        self.rounds = rounds or default_rounds()
+        self.size = size
+        self.queue_size = size if queue_size is None else queue_size
+        self._slots = BoundedSemaphore(self.size + self.queue_size)
+        self._pool = None
+        self._pool_lock = Lock()
+
+    @classmethod
+    def from_env(cls) -> "Hasher":
+        """Build the hasher configured by BCRYPT_POOL_SIZE (default: 0,
+        inline) and BCRYPT_QUEUE_SIZE (default: the pool size)
+        """
+        size = int(getenv("BCRYPT_POOL_SIZE", 0))
+        queue_size = getenv("BCRYPT_QUEUE_SIZE")
+        return cls(size, None if queue_size is None else int(queue_size))
+
+    def run(self, function: Callable, *args):
+        """Call function(*args), in the pool if there is one
+        """
+        if not self.size:
+            return function(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            try:
+                return self._submit(function, *args).result()
+            except BrokenProcessPool:
+                return self._submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+    def map(self, function: Callable, *iterables) -> Iterator:
+        """Yield function(*args) for each args of iterables, in order, in
+        the pool if there is one
+
+        Jobs wait for a slot instead of raising HashingBusy, and at most
+        size of them are in flight: other callers' jobs queue behind a
+        few bulk jobs, not behind the whole batch.
+        """
+        if not self.size:
+            for args in zip(*iterables):
+                yield function(*args)
+            return
+        pending = deque()
+        try:
+            for args in zip(*iterables):
+                if len(pending) == self.size:
+                    yield self._map_result(function, *pending.popleft())
+                pending.append((self._submit_waiting(function, args), args))
+            while pending:
+                yield self._map_result(function, *pending.popleft())
+        finally:
+            for future, _ in pending:
+                future.cancel()
+
+    def _submit_waiting(self, function: Callable, args: tuple) -> Future:
+        """Submit a job once a slot is free, freed when the job is done
+        """
+        self._slots.acquire()
+        try:
+            future = self._submit(function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _map_result(self, function: Callable, future: Future, args: tuple):
+        """Return the result of a job of map, run once more in a new pool
+        if a worker died
+        """
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            return self._submit_waiting(function, args).result()
+
+    def hash_password(self, password: str) -> bytes:
+        """Hashes a password
+        """
+        return self.run(hash_password, password, self.rounds)
+
+    def hash_passwords(self, passwords: Iterable[str]) -> Iterator[bytes]:
+        """Hashes passwords in bulk (see map)
+        """
+        return self.map(hash_password, passwords, repeat(self.rounds))
+
+    def check_password(self, password: str, hashed_password: bytes) -> bool:
+        """Checks a password against its hash
+        """
+        return self.run(check_password, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: bytes) -> bool:
+        """Checks if a hash uses a lower work factor than new hashes
+        """
+        return hash_rounds(hashed_password) < self.rounds
+
+    def shutdown(self) -> None:
+        """Stop the worker processes
+        """
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _release(self, future: Future) -> None:
+        """Free the slot of a finished (or cancelled) job
+        """
+        self._slots.release()
+
+    def _submit(self, function: Callable, *args) -> Future:
+        """Submit a job to the pool, replacing the pool if it is broken
+        """
+        pool = self._executor()
+        try:
+            return pool.submit(function, *args)
+        except BrokenProcessPool:
+            self._discard(pool)
+            return self._executor().submit(function, *args)
+
+    def _discard(self, pool: ProcessPoolExecutor) -> None:
+        """Drop a broken pool, unless another thread already replaced it
+        """
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        """Return the pool, started on first use
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    mp_context=get_context("forkserver"))
+            return self._pool
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Session cache module
+"""
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Optional, Tuple
+
+
+class SessionCache:
+    """Bounded LRU cache, with a TTL, of session ID -> (user ID, email)
+
+    Counts its hits and misses. Entries are invalidated by user ID (a
+    user has at most one session). Every invalidation bumps the
+    generation of the cache, and put ignores values read from the
+    database before the last invalidation, so a lookup racing with a
+    logout cannot cache the session it ended.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60) -> None:
+        """Initialize an empty cache
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._session_by_user = {}
+        self._lock = Lock()
+
+    def get(self, session_id: str) -> Optional[Tuple[int, str]]:
+        """Return the (user ID, email) of a session, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry[2] < monotonic():
+                if entry is not None:
+                    self._drop(session_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, session_id: str, user_id: int, email: str,
+            generation: int) -> None:
+        """Cache the user of a session, evicting the least recently used,
+        unless the cache was invalidated since generation was read
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+            previous = self._session_by_user.get(user_id)
+            if previous is not None and previous != session_id:
+                self._drop(previous)
+            self._entries[session_id] = (user_id, email,
+                                         monotonic() + self.ttl)
+            self._entries.move_to_end(session_id)
+            self._session_by_user[user_id] = session_id
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Forget the session of a user
+        """
+        with self._lock:
+            self.generation += 1
+            session_id = self._session_by_user.get(user_id)
+            if session_id is not None:
+                self._drop(session_id)
+
+    def stats(self) -> dict:
+        """Return the hits, misses and size of the cache
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self._entries)}
+
+    def _drop(self, session_id: str) -> None:
+        """Remove an entry (the lock is held)
+        """
+        user_id = self._entries.pop(session_id)[0]
+        if self._session_by_user.get(user_id) == session_id:
+            del self._session_by_user[user_id]
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Tests of the bulk user registration
+
+Usage: python3 -m unittest test_bulk_register
+"""
+import io
+import os
+import unittest
+from unittest import mock
+
+from bulk_register import read_users, register_users
+from db import DB
+from hashing import Hasher, check_password
+
+
+class ReadUsersTest(unittest.TestCase):
+    """Parsing of the records
+    """
+
+    def test_non_string_values_are_invalid(self):
+        """JSONL values that are not strings are invalid records
+        """
+        stream = io.StringIO(
+            '{"email": "a@b.c", "password": 123}\n'
+            '{"email": ["a@b.c"], "password": "pwd"}\n'
+            '{"email": "a@b.c", "password": {"p": "pwd"}}\n'
+            '{"email": "a@b.c", "password": true}\n'
+            '["a@b.c", "pwd"]\n'
+            'not json\n'
+            '{"email": "a@b.c", "password": "pwd"}\n')
+        self.assertEqual(list(read_users(stream, "jsonl")),
+                         [(None, None)] * 6 + [("a@b.c", "pwd")])
+
+    def test_csv(self):
+        """CSV records with a missing value are invalid
+        """
+        stream = io.StringIO("email,password\na@b.c,pwd\nd@e.f\n,pwd\n")
+        self.assertEqual(list(read_users(stream, "csv")),
+                         [("a@b.c", "pwd"), (None, None), (None, None)])
+
+
+class RegisterUsersTest(unittest.TestCase):
+    """Registration of the records
+    """
+
+    def test_invalid_records_do_not_abort_the_import(self):
+        """Records of the wrong type are counted, the others registered
+        """
+        db = DB("sqlite://")
+        stream = io.StringIO(
+            '{"email": "a@b.c", "password": "pwd"}\n'
+            '{"email": "d@e.f", "password": 123}\n'
+            '{"email": "g@h.i", "password": "pwd"}\n'
+            '{"email": "a@b.c", "password": "other"}\n')
+        counts = register_users(db, read_users(stream, "jsonl"),
+                                batch_size=2, hasher=Hasher(rounds=4))
+        self.assertEqual(counts,
+                         {"created": 2, "duplicate": 1, "invalid": 1})
+        user = db.find_user_by(email="g@h.i")
+        self.assertTrue(check_password("pwd", user.hashed_password))
+
+
+class HasherMapTest(unittest.TestCase):
+    """Bulk hashing through the pool
+    """
+
+    def test_map_keeps_the_order_and_frees_the_slots(self):
+        """Results come in order, and every slot is free afterwards
+        """
+        hasher = Hasher(size=2, queue_size=1, rounds=4)
+        try:
+            passwords = ["pwd{}".format(i) for i in range(5)]
+            hashes = list(hasher.hash_passwords(passwords))
+            self.assertEqual(len(hashes), 5)
+            for password, hashed in zip(passwords, hashes):
+                self.assertTrue(check_password(password, hashed))
+            for _ in range(3):
+                self.assertTrue(hasher._slots.acquire(blocking=False))
+        finally:
+            hasher.shutdown()
+
+
+class BulkRouteTest(unittest.TestCase):
+    """Access to the /users/bulk route
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Load the app on an in-memory database
+        """
+        with mock.patch.dict(os.environ, {"DB_URL": "sqlite://"}):
+            import app
+        cls.app = app
+        cls.client = app.app.test_client()
+
+    def post(self, body: str, token: str = None):
+        """Post a JSONL body, with a bearer token if there is one
+        """
+        headers = {}
+        if token is not None:
+            headers["Authorization"] = "Bearer {}".format(token)
+        return self.client.post("/users/bulk", data=body, headers=headers,
+                                content_type="application/jsonl")
+
+    def test_disabled_without_a_token(self):
+        """Without BULK_REGISTER_TOKEN, every request is forbidden
+        """
+        with mock.patch.dict(os.environ):
+            os.environ.pop("BULK_REGISTER_TOKEN", None)
+            self.assertEqual(self.post("", "").status_code, 403)
+
+    def test_unavailable_without_a_hashing_pool(self):
+        """Without hashing processes, the route answers 503
+        """
+        body = '{"email": "inline@b.c", "password": "pwd"}\n'
+        with mock.patch.dict(os.environ, {"BULK_REGISTER_TOKEN": "secret"}), \
+                mock.patch.object(self.app.AUTH, "_hasher",
+                                  Hasher(rounds=4)):
+            self.assertEqual(self.post(body, "secret").status_code, 503)
+
+    def test_token_and_size(self):
+        """Requests need the token and a body of at most BULK_MAX_BYTES
+        """
+        body = '{"email": "bulk@b.c", "password": "pwd"}\n'
+        hasher = Hasher(size=1, rounds=4)
+        with mock.patch.dict(os.environ, {"BULK_REGISTER_TOKEN": "secret"}), \
+                mock.patch.object(self.app.AUTH, "_hasher", hasher):
+            self.assertEqual(self.post(body).status_code, 403)
+            self.assertEqual(self.post(body, "wrong").status_code, 403)
+            with mock.patch.object(self.app, "BULK_MAX_BYTES", 10):
+                self.assertEqual(self.post(body, "secret").status_code, 413)
+            response = self.post(body, "secret")
+        hasher.shutdown()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(),
+                         {"created": 1, "duplicate": 0, "invalid": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
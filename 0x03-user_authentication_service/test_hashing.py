@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Tests of the password hashing pool
+
+Usage: python3 -m unittest test_hashing
+"""
+import os
+import signal
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+
+from hashing import Hasher, check_password
+
+
+def kill_worker() -> None:
+    """Kill the worker process running this job, as an OOM kill would
+    """
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+class HasherPoolTest(unittest.TestCase):
+    """Recovery of the worker pool
+    """
+
+    def setUp(self):
+        """Start a pool of one worker
+        """
+        self.hasher = Hasher(size=1, rounds=4)
+
+    def tearDown(self):
+        """Stop the pool
+        """
+        self.hasher.shutdown()
+
+    def test_killed_worker_is_replaced(self):
+        """A worker killed between jobs does not break the next ones
+        """
+        hashed = self.hasher.hash_password("pwd")
+        os.kill(self.hasher.run(os.getpid), signal.SIGKILL)
+        self.assertTrue(self.hasher.check_password("pwd", hashed))
+        self.assertTrue(self.hasher.check_password("pwd", hashed))
+
+    def test_job_killing_its_worker(self):
+        """A job that breaks the pool twice fails, the next ones do not
+        """
+        with self.assertRaises(BrokenProcessPool):
+            self.hasher.run(kill_worker)
+        self.assertEqual(len(list(self.hasher.hash_passwords(["a", "b"]))),
+                         2)
+        for _ in range(2):
+            self.assertTrue(self.hasher._slots.acquire(blocking=False))
+
+    def test_map_after_a_killed_worker(self):
+        """Bulk hashing goes on in a new pool
+        """
+        os.kill(self.hasher.run(os.getpid), signal.SIGKILL)
+        passwords = ["pwd{}".format(i) for i in range(3)]
+        for password, hashed in zip(passwords,
+                                    self.hasher.hash_passwords(passwords)):
+            self.assertTrue(check_password(password, hashed))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -12,6 +12,9 @@ class User(Base):
     """
     Represents a user in the system.
 
+    The columns users are looked up by (email, session_id and
+    reset_token) have unique indexes.
+
     Attributes:
         id (int): The unique identifier for the user.
         email (str): The email address of the user.
@@ -22,7 +25,7 @@ class User(Base):
     __tablename__ = 'users'
 
     id = Column(Integer, primary_key=True)
-    email = Column(String(250), nullable=False)
+    email = Column(String(250), nullable=False, unique=True, index=True)
     hashed_password = Column(String(250), nullable=False)
-    session_id = Column(String(250), nullable=True)
-    reset_token = Column(String(250), nullable=True)
+    session_id = Column(String(250), nullable=True, unique=True, index=True)
+    reset_token = Column(String(250), nullable=True, unique=True, index=True)